@@ -1,4 +1,5 @@
 import requests
+from requests.adapters import HTTPAdapter
 import threading
 import time
 import io
@@ -7,12 +8,20 @@ import os
 import logging
 import logging.handlers
 import atexit
-from datetime import datetime
+from datetime import datetime, timezone
 import sys
 import locale
 import tempfile
 import json
+import queue
 import asyncio
+import concurrent.futures
+import collections
+import functools
+import statistics
+import re
+import difflib
+import unicodedata
 from bleak import BleakScanner
 import keyboard
 
@@ -36,6 +45,20 @@ from PyQt6.QtCore import (
 # Voice Control è integrato direttamente
 VOICE_CONTROL_AVAILABLE = True
 
+# Client WebSocket per gli aggiornamenti di stato (opzionale, altrimenti polling REST)
+try:
+    import websockets
+    WEBSOCKET_AVAILABLE = True
+except ImportError:
+    WEBSOCKET_AVAILABLE = False
+
+# Riconoscimento vocale offline (opzionale, altrimenti solo Google)
+try:
+    import vosk
+    VOSK_AVAILABLE = True
+except ImportError:
+    VOSK_AVAILABLE = False
+
 # Funzione per ottenere il percorso base (directory dell'eseguibile o dello script)
 def get_base_path():
     """Restituisce il percorso della directory contenente l'eseguibile o lo script."""
@@ -78,6 +101,7 @@ ICONS_MAP = {
 }
 
 BLE_ENTITY_FILE = 'ble_entity.json'
+AREA_SNAPSHOT_FILE = 'area_snapshot.json'
 
 def play_beep(frequency, duration):
     """Riproduce un beep solo se i suoni sono abilitati."""
@@ -115,6 +139,155 @@ def setup_logging():
     
     return logger
 
+class AsyncRuntime:
+    """Loop asyncio persistente in un thread di background.
+    
+    Scansione BLE e I/O verso Home Assistant girano su questo unico loop invece di
+    creare un nuovo event loop (e un nuovo thread) ad ogni scansione o richiesta.
+    submit(), run_blocking() e call_soon() sono thread-safe e possono essere
+    chiamati dal thread Qt.
+    """
+
+    def __init__(self, max_workers=8):
+        self.max_workers = max_workers
+        self._loop = None
+        self._thread = None
+        self._executor = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        """Ritorna il loop asyncio, avviando il thread al primo utilizzo."""
+        self.start()
+        return self._loop
+
+    def start(self):
+        """Avvia il thread del loop (idempotente)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._ready.clear()
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix='spc-io'
+            )
+            self._thread = threading.Thread(target=self._run, name='spc-async', daemon=True)
+            self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._loop.set_default_executor(self._executor)
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+
+    def submit(self, coro):
+        """Esegue una coroutine sul loop. Ritorna un concurrent.futures.Future."""
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        future.add_done_callback(self._log_exception)
+        return future
+
+    def run_blocking(self, func, *args, **kwargs):
+        """Esegue una funzione bloccante (es. una chiamata REST) nel pool di I/O del loop.
+        
+        Ritorna un concurrent.futures.Future.
+        """
+        self.start()
+        future = self._executor.submit(functools.partial(func, *args, **kwargs))
+        future.add_done_callback(self._log_exception)
+        return future
+
+    def call_soon(self, callback, *args):
+        """Pianifica una callback sul thread del loop."""
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    def stop(self):
+        """Ferma il loop e il pool di I/O."""
+        with self._lock:
+            if self._loop is None or self._thread is None:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=2)
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._thread = None
+            self._loop = None
+
+    @staticmethod
+    def _log_exception(future):
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None and 'logger' in globals():
+            logger.error(f"Errore in task di background: {error}")
+
+_async_runtime = AsyncRuntime()
+
+def get_async_runtime():
+    """Ritorna il loop asyncio persistente condiviso dal processo."""
+    return _async_runtime
+
+HA_POOL_SIZE = 10           # connessioni keep-alive per istanza Home Assistant
+HA_REQUEST_TIMEOUT = 5      # timeout di default delle richieste REST (secondi)
+
+class HomeAssistantClient:
+    """Client REST per una istanza Home Assistant.
+    
+    Mantiene una requests.Session con pool di connessioni keep-alive, così le
+    chiamate successive riusano la stessa connessione TCP/TLS. Header di
+    autenticazione e timeout sono centralizzati qui.
+    """
+
+    def __init__(self, url, token, pool_size=HA_POOL_SIZE, timeout=HA_REQUEST_TIMEOUT):
+        self.url = url.rstrip('/')
+        self.token = token
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+        })
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def request(self, method, path, timeout=None, **kwargs):
+        """Esegue una richiesta verso path (es. '/api/states') sulla sessione condivisa."""
+        return self.session.request(method, f"{self.url}{path}", timeout=timeout or self.timeout, **kwargs)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+_ha_clients = {}
+_ha_clients_lock = threading.Lock()
+
+def get_ha_client(url=None, token=None):
+    """Ritorna il client condiviso per l'istanza indicata (default: istanza corrente)."""
+    url = url or HOME_ASSISTANT_URL
+    token = token or API_TOKEN
+    with _ha_clients_lock:
+        client = _ha_clients.get((url, token))
+        if client is None:
+            client = HomeAssistantClient(url, token)
+            _ha_clients[(url, token)] = client
+        return client
+
+def close_ha_clients():
+    """Chiude tutte le sessioni HTTP aperte."""
+    with _ha_clients_lock:
+        for client in _ha_clients.values():
+            client.close()
+        _ha_clients.clear()
+
 # =============================================================================
 # VOICE CONTROL INTEGRATO
 # =============================================================================
@@ -155,45 +328,10 @@ def load_voice_ble_mapping():
         safe_print(f"⚠️ Errore caricamento {BLE_ENTITY_FILE}: {e}")
         return None
 
-async def voice_detect_current_room(ble_mapping, scan_duration=3):
-    """Rileva la stanza corrente basandosi sul beacon BLE con segnale più forte."""
-    try:
-        devices = await BleakScanner.discover(timeout=scan_duration, return_adv=True)
-        
-        strongest_device = None
-        strongest_rssi = -1000
-        strongest_room = None
-        
-        for device, adv_data in devices.values():
-            mac = device.address.upper()
-            if mac in ble_mapping:
-                rssi = adv_data.rssi
-                safe_print(f"📍 Beacon: {device.name or mac} → RSSI: {rssi}")
-                
-                if rssi > strongest_rssi:
-                    strongest_rssi = rssi
-                    strongest_device = device
-                    strongest_room = ble_mapping[mac]
-        
-        if strongest_room:
-            mac = strongest_device.address.upper()
-            safe_print(f"📍 Beacon più forte: {strongest_device.name or mac} → {strongest_room} (RSSI: {strongest_rssi})")
-            return strongest_room
-        
-        return None
-            
-    except Exception as e:
-        safe_print(f"✗ Errore scansione BLE: {e}")
-        return None
-
 def voice_get_all_entities(ha_url, ha_token):
     """Recupera tutte le entità da Home Assistant (per voice control)."""
     try:
-        headers = {
-            "Authorization": f"Bearer {ha_token}",
-            "Content-Type": "application/json",
-        }
-        response = requests.get(f"{ha_url}/api/states", headers=headers, timeout=5)
+        response = get_ha_client(ha_url, ha_token).get('/api/states')
         if response.status_code == 200:
             return response.json()
         return []
@@ -204,10 +342,7 @@ def voice_get_all_entities(ha_url, ha_token):
 def voice_get_entities_in_area(ha_url, ha_token, area_id, domain_filter=None):
     """Recupera tutte le entità appartenenti a una specifica area/stanza usando API template."""
     try:
-        headers = {
-            "Authorization": f"Bearer {ha_token}",
-            "Content-Type": "application/json",
-        }
+        client = get_ha_client(ha_url, ha_token)
         
         safe_print(f"🔍 Cerco entità per area_id: '{area_id}', domini: {domain_filter}")
         
@@ -215,12 +350,7 @@ def voice_get_entities_in_area(ha_url, ha_token, area_id, domain_filter=None):
         # area_entities() restituisce tutte le entità (anche quelle assegnate via device)
         template = f"{{{{ area_entities('{area_id}') }}}}"
         
-        response = requests.post(
-            f"{ha_url}/api/template",
-            headers=headers,
-            json={"template": template},
-            timeout=5
-        )
+        response = client.post('/api/template', json={"template": template})
         
         if response.status_code != 200:
             safe_print(f"✗ Errore API template: {response.status_code}")
@@ -251,7 +381,7 @@ def voice_get_entities_in_area(ha_url, ha_token, area_id, domain_filter=None):
             filtered_ids = entity_ids_in_area
         
         # Ottieni gli stati delle entità filtrate
-        states_response = requests.get(f"{ha_url}/api/states", headers=headers, timeout=5)
+        states_response = client.get('/api/states')
         if states_response.status_code != 200:
             safe_print(f"✗ Errore API states: {states_response.status_code}")
             return []
@@ -274,40 +404,242 @@ def voice_get_entities_in_area(ha_url, ha_token, area_id, domain_filter=None):
         safe_print(f"✗ Errore recupero entità area: {e}")
         return []
 
-def voice_find_entity_by_name(entities, name_to_find, current_room_entities=None, entity_domains=None):
-    """Trova un'entità dal nome friendly o entity_id."""
+VOICE_MATCH_THRESHOLD = 0.75      # confidenza minima per accettare un'entità trovata per somiglianza
+VOICE_MATCH_MIN_TOKEN_RATIO = 0.75 # somiglianza minima tra due parole scritte diversamente
+VOICE_MATCH_CANDIDATES = 5         # candidati mostrati nel log quando nessuno supera la soglia
+VOICE_MATCH_MAX_SCORED = 200       # entità valutate al massimo per ogni ricerca approssimata
+VOICE_STOPWORDS = {
+    # Italiano
+    'il', 'lo', 'la', 'i', 'gli', 'le', 'l', 'un', 'uno', 'una', 'di', 'del', 'dello', 'della',
+    'dei', 'degli', 'delle', 'da', 'dal', 'dalla', 'in', 'nel', 'nella', 'su', 'sul', 'sulla',
+    'con', 'per', 'e',
+    # Inglese
+    'the', 'a', 'an', 'of', 'on', 'in', 'to', 'and',
+}
+PHONETIC_RULES = [
+    # Regole comuni a italiano e inglese, applicate in ordine
+    ('sch', 'sk'), ('ph', 'f'), ('gh', 'g'), ('ch', 'k'), ('ck', 'k'), ('qu', 'k'),
+    ('gli', 'li'), ('gn', 'n'), ('x', 'ks'), ('y', 'i'), ('w', 'v'), ('j', 'i'), ('z', 's'), ('h', ''),
+]
+
+def fold_accents(text):
+    """Minuscolo senza accenti: 'Lampada Più' -> 'lampada piu'."""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+def phonetic_key(word):
+    """Chiave fonetica semplificata (IT/EN): consonanti senza doppie, vocali finali ignorate.
+    
+    'lampada' e 'lampade' -> 'lmpd'; 'cucina' e 'kucina' -> 'ksn'.
+    """
+    key = word
+    for pattern, replacement in PHONETIC_RULES:
+        key = key.replace(pattern, replacement)
+    key = re.sub(r'c(?=[ei])', 's', key).replace('c', 'k').replace('q', 'k')
+    key = re.sub(r'(.)\1+', r'\1', key)
+    return key[:1] + re.sub(r'[aeiou]', '', key[1:])
+
+def name_tokens(text):
+    """Parole significative di un nome come (parola senza accenti, chiave fonetica)."""
+    words = re.findall(r'[a-z0-9]+', fold_accents(text))
+    significant = [w for w in words if w not in VOICE_STOPWORDS] or words
+    return tuple((w, phonetic_key(w)) for w in significant)
+
+def _token_similarity(query_token, name_token):
+    if query_token[0] == name_token[0]:
+        return 1.0
+    if query_token[1] == name_token[1]:
+        return 0.9
+    ratio = difflib.SequenceMatcher(None, query_token[0], name_token[0]).ratio()
+    return ratio if ratio >= VOICE_MATCH_MIN_TOKEN_RATIO else 0.0
+
+def token_set_similarity(query_tokens, tokens, token_similarity=_token_similarity):
+    """Somiglianza (0-1) tra due insiemi di parole: coefficiente di Dice con corrispondenze approssimate."""
+    if not query_tokens or not tokens:
+        return 0.0
+    remaining = list(tokens)
+    matched = 0.0
+    for query_token in query_tokens:
+        best, best_index = 0.0, None
+        for index, token in enumerate(remaining):
+            similarity = token_similarity(query_token, token)
+            if similarity > best:
+                best, best_index = similarity, index
+        if best_index is not None:
+            matched += best
+            del remaining[best_index]
+    return 2 * matched / (len(query_tokens) + len(tokens))
+
+
+class EntityNameIndex:
+    """Indice dei nomi delle entità per la ricerca vocale.
+    
+    Contiene il friendly_name esatto (minuscolo), un indice a trigrammi su
+    friendly_name ed entity_id per le ricerche di sottostringa e le entità per
+    dominio. A parità di corrispondenza vince l'entità che viene prima nella
+    lista, come nella ricerca lineare. update() reindicizza solo le entità
+    nuove o rinominate.
+    
+    Per la ricerca approssimata (find_similar) ogni nome è precalcolato come
+    parole senza accenti con la loro chiave fonetica, indicizzate per chiave
+    fonetica e per prefisso.
+    """
+    
+    def __init__(self, entities=()):
+        self._positions = {}  # entity_id -> posizione nella lista
+        self._names = {}      # entity_id -> (friendly_name, entity_id) in minuscolo
+        self._exact = {}      # friendly_name -> {entity_id}
+        self._trigrams = {}   # trigramma -> {entity_id}
+        self._domains = {}    # dominio -> {entity_id}
+        self._tokens = {}     # entity_id -> [parole del friendly_name, parole dell'entity_id]
+        self._phonetic = {}   # chiave fonetica o prefisso -> {entity_id}
+        self.update(entities)
+    
+    def __len__(self):
+        return len(self._names)
+    
+    @staticmethod
+    def _trigrams_of(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+    
+    @staticmethod
+    def _phonetic_keys_of(tokens):
+        return {key for word, phonetic in tokens for key in (phonetic, word[:3])}
+    
+    def _add(self, entity_id, names):
+        self._names[entity_id] = names
+        self._exact.setdefault(names[0], set()).add(entity_id)
+        self._domains.setdefault(entity_id.split('.', 1)[0], set()).add(entity_id)
+        for trigram in self._trigrams_of(names[0]) | self._trigrams_of(names[1]):
+            self._trigrams.setdefault(trigram, set()).add(entity_id)
+        # Parole del nome e dell'object_id (senza dominio) per la ricerca approssimata
+        variants = [name_tokens(names[0]), name_tokens(names[1].split('.', 1)[-1].replace('_', ' '))]
+        self._tokens[entity_id] = [tokens for tokens in variants if tokens]
+        for key in self._phonetic_keys_of(variants[0] + variants[1]):
+            self._phonetic.setdefault(key, set()).add(entity_id)
+    
+    def _remove(self, entity_id):
+        names = self._names.pop(entity_id, None)
+        if names is None:
+            return
+        tokens = [token for variant in self._tokens.pop(entity_id, []) for token in variant]
+        postings = [(self._exact, names[0]), (self._domains, entity_id.split('.', 1)[0])]
+        postings += [(self._trigrams, t) for t in self._trigrams_of(names[0]) | self._trigrams_of(names[1])]
+        postings += [(self._phonetic, key) for key in self._phonetic_keys_of(tokens)]
+        for index, key in postings:
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(entity_id)
+                if not ids:
+                    del index[key]
+    
+    def update(self, entities):
+        """Allinea l'indice alla lista di entità."""
+        positions = {}
+        for position, entity in enumerate(entities):
+            entity_id = entity['entity_id']
+            positions.setdefault(entity_id, position)
+            names = (entity.get('attributes', {}).get('friendly_name', '').lower(), entity_id.lower())
+            if self._names.get(entity_id) != names:
+                self._remove(entity_id)
+                self._add(entity_id, names)
+        for entity_id in [e for e in self._names if e not in positions]:
+            self._remove(entity_id)
+        self._positions = positions
+    
+    def _first(self, entity_ids, domains=None):
+        if domains is not None:
+            entity_ids = [e for e in entity_ids if e.split('.', 1)[0] in domains]
+        return min(entity_ids, key=self._positions.__getitem__, default=None)
+    
+    def find_exact(self, name_lower, domains=None):
+        """Prima entità il cui friendly_name è esattamente name_lower."""
+        return self._first(self._exact.get(name_lower, ()), domains)
+    
+    def find_substring(self, name_lower, domains=None):
+        """Prima entità con name_lower contenuto nel friendly_name o nell'entity_id."""
+        if len(name_lower) < 3:
+            # Troppo corto per i trigrammi: scorre le entità dei domini richiesti
+            if domains is None:
+                candidates = self._names
+            else:
+                candidates = set().union(*(self._domains.get(d, ()) for d in domains))
+        else:
+            postings = sorted((self._trigrams.get(t, set()) for t in self._trigrams_of(name_lower)), key=len)
+            candidates = set.intersection(*postings) if postings[0] else set()
+        matches = [e for e in candidates
+                   if name_lower in self._names[e][0] or name_lower in self._names[e][1]]
+        return self._first(matches, domains)
+    
+    def find_similar(self, name, domains=None, limit=VOICE_MATCH_CANDIDATES):
+        """Entità con nome simile a name: lista di (entity_id, confidenza) dalla più probabile.
+        
+        Considera solo le entità che condividono almeno una chiave fonetica o un
+        prefisso con name (al massimo VOICE_MATCH_MAX_SCORED, quelle con più
+        chiavi in comune); a parità di confidenza vince la prima nella lista.
+        """
+        query_tokens = name_tokens(name)
+        if not query_tokens:
+            return []
+        shared_keys = collections.Counter()
+        for key in self._phonetic_keys_of(query_tokens):
+            shared_keys.update(self._phonetic.get(key, ()))
+        if domains is not None:
+            shared_keys = collections.Counter({e: n for e, n in shared_keys.items() if e.split('.', 1)[0] in domains})
+        # Valuta solo le entità con più chiavi in comune
+        candidates = [e for e, _ in shared_keys.most_common(VOICE_MATCH_MAX_SCORED)]
+        
+        # Il vocabolario è piccolo: ogni coppia di parole viene confrontata una sola volta
+        token_similarity = functools.lru_cache(maxsize=None)(_token_similarity)
+        ranked = []
+        for entity_id in candidates:
+            confidence = max(token_set_similarity(query_tokens, tokens, token_similarity)
+                             for tokens in self._tokens[entity_id])
+            if confidence > 0:
+                ranked.append((entity_id, confidence))
+        ranked.sort(key=lambda item: (-item[1], self._positions[item[0]]))
+        return ranked[:limit]
+
+
+def voice_find_entity_by_name(entities, name_to_find, current_room_entities=None, entity_domains=None,
+                              entity_index=None, room_index=None):
+    """Trova un'entità dal nome friendly o entity_id.
+    
+    entity_index / room_index sono gli EntityNameIndex già costruiti per entities
+    e current_room_entities; se mancano vengono creati al momento.
+    Se nessun nome corrisponde esattamente o come sottostringa, sceglie il più
+    simile (parole, fonetica, accenti) sopra VOICE_MATCH_THRESHOLD, preferendo la stanza.
+    """
     name_lower = name_to_find.lower().strip()
     if entity_domains is None:
         entity_domains = ['light']
     
     # Se abbiamo entità della stanza corrente, cerca prima lì
     if current_room_entities:
-        for entity in current_room_entities:
-            friendly_name = entity.get('attributes', {}).get('friendly_name', '')
-            if friendly_name.lower() == name_lower:
-                return entity['entity_id']
-        
-        for entity in current_room_entities:
-            friendly_name = entity.get('attributes', {}).get('friendly_name', '')
-            entity_id = entity['entity_id']
-            if name_lower in friendly_name.lower() or name_lower in entity_id.lower():
-                return entity['entity_id']
+        if room_index is None:
+            room_index = EntityNameIndex(current_room_entities)
+        entity_id = room_index.find_exact(name_lower) or room_index.find_substring(name_lower)
+        if entity_id:
+            return entity_id
     
     # Cerca in tutte le entità ma solo nei domini configurati
-    domain_prefixes = tuple(f"{d}." for d in entity_domains)
-    filtered_entities = [e for e in entities if e['entity_id'].startswith(domain_prefixes)]
-    
-    for entity in filtered_entities:
-        friendly_name = entity.get('attributes', {}).get('friendly_name', '')
-        if friendly_name.lower() == name_lower:
-            return entity['entity_id']
-    
-    for entity in filtered_entities:
-        friendly_name = entity.get('attributes', {}).get('friendly_name', '')
-        entity_id = entity['entity_id']
-        if name_lower in friendly_name.lower() or name_lower in entity_id.lower():
-            return entity['entity_id']
+    if entity_index is None:
+        entity_index = EntityNameIndex(entities)
+    domains = set(entity_domains)
+    entity_id = entity_index.find_exact(name_lower, domains) or entity_index.find_substring(name_lower, domains)
+    if entity_id:
+        return entity_id
     
+    # Nessuna corrispondenza testuale: candidati per somiglianza, prima nella stanza
+    candidates = room_index.find_similar(name_lower) if room_index is not None else []
+    if not candidates or candidates[0][1] < VOICE_MATCH_THRESHOLD:
+        candidates = entity_index.find_similar(name_lower, domains) or candidates
+    if candidates and candidates[0][1] >= VOICE_MATCH_THRESHOLD:
+        entity_id, confidence = candidates[0]
+        safe_print(f"≈ '{name_to_find}' → {entity_id} (confidenza {confidence:.2f})")
+        return entity_id
+    if candidates:
+        safe_print(f"? Candidati sotto soglia: {', '.join(f'{e} ({c:.2f})' for e, c in candidates)}")
     return None
 
 def voice_execute_command(ha_url, ha_token, entity_id, action):
@@ -326,25 +658,302 @@ def voice_execute_command(ha_url, ha_token, entity_id, action):
         if not service:
             return False
         
-        headers = {
-            "Authorization": f"Bearer {ha_token}",
-            "Content-Type": "application/json",
-        }
-        
         payload = {"entity_id": entity_id}
-        url = f"{ha_url}/api/services/{service.replace('.', '/')}"
+        path = f"/api/services/{service.replace('.', '/')}"
         
-        response = requests.post(url, headers=headers, json=payload, timeout=5)
+        response = get_ha_client(ha_url, ha_token).post(path, json=payload)
         return response.status_code == 200
     except Exception as e:
         safe_print(f"✗ Errore esecuzione comando: {e}")
         return False
 
 
+VOICE_SAMPLE_RATE = 16000          # Hz, formato atteso dal riconoscimento
+VOICE_FIXED_DURATION = 5.0         # secondi registrati in modalità 'fixed'
+VOICE_FRAME_DURATION = 0.03        # secondi per blocco audio analizzato dal VAD
+VOICE_MAX_DURATION = 8.0           # durata massima di un comando in modalità 'vad'
+VOICE_START_TIMEOUT = 4.0          # secondi di attesa dell'inizio del parlato
+VOICE_TRAILING_SILENCE = 0.7       # secondi di silenzio dopo il parlato per chiudere la registrazione
+VOICE_MIN_SPEECH = 0.2             # secondi di parlato minimi per considerarlo un comando
+VOICE_PRE_ROLL = 0.3               # secondi di audio conservati prima dell'inizio del parlato
+VOICE_ENERGY_FLOOR = 300.0         # RMS minimo (int16) considerato parlato
+VOICE_NOISE_FACTOR = 3.0           # il parlato deve superare di tanto il rumore di fondo stimato
+VOICE_COMMANDS = {
+    # Italiano
+    'accendi': 'turn_on',
+    'accenda': 'turn_on',
+    'attiva': 'turn_on',
+    'spegni': 'turn_off',
+    'spegna': 'turn_off',
+    'disattiva': 'turn_off',
+    'apri': 'open_cover',
+    'chiudi': 'close_cover',
+    # Inglese
+    'turn on': 'turn_on',
+    'switch on': 'turn_on',
+    'turn off': 'turn_off',
+    'switch off': 'turn_off',
+    'open': 'open_cover',
+    'close': 'close_cover',
+}
+VOICE_ALL_LIGHTS_PHRASES = [
+    # Italiano
+    'tutte le luci', 'tutte le luce', 'tutte luci', 'le luci', 'la luce',
+    # Inglese
+    'all lights', 'all the lights', 'the lights'
+]
+VOICE_LED_PHRASES = [
+    # Italiano - specifici
+    'tutti i led', 'tutte le led', 'luce led', 'luci led', 'le led', 'i led',
+    # Inglese - specifici
+    'led lights', 'led light', 'the led', 'the leds', 'all leds'
+]
+# Parole di contorno ammesse dalla grammatica (articoli e congiunzioni dei comandi multipli)
+VOICE_GRAMMAR_FILLERS = ['il', 'lo', 'la', 'le', 'i', 'luce', 'luci', 'led', 'lights', 'the', 'e', 'and']
+VOICE_RECOGNIZER = 'google'        # backend di riconoscimento: google, vosk
+VOICE_LANGUAGE = 'it-IT'           # lingua per il riconoscimento Google
+VOSK_MODEL_PATH = 'vosk-model-small-it-0.22'  # cartella del modello Vosk (relativa all'eseguibile)
+
+
+class CommandGrammar:
+    """Grammatica dei comandi vocali: verbi, frasi di gruppo e nomi delle entità.
+    
+    La parte fissa (verbi, gruppi, parole di contorno) viene calcolata una volta;
+    i nomi sono tenuti per sorgente ('all', 'room') e la grammatica viene
+    ricompilata (version += 1) solo quando l'insieme dei nomi cambia davvero.
+    """
+    
+    STATIC_PHRASES = sorted(set(VOICE_COMMANDS) | set(VOICE_ALL_LIGHTS_PHRASES) |
+                            set(VOICE_LED_PHRASES) | set(VOICE_GRAMMAR_FILLERS))
+    
+    def __init__(self):
+        self.version = 0
+        self._sources = {}  # sorgente -> frozenset dei nomi
+        self._names = ()
+        self._json = None
+    
+    def set_entities(self, source, entities, entity_domains=None):
+        """Aggiorna i nomi di una sorgente. Ritorna True se la grammatica è cambiata."""
+        domain_prefixes = tuple(f"{d}." for d in entity_domains) if entity_domains else ('',)
+        names = frozenset(
+            name for name in (
+                entity.get('attributes', {}).get('friendly_name', '').lower().strip()
+                for entity in entities if entity['entity_id'].startswith(domain_prefixes)
+            ) if name
+        )
+        if self._sources.get(source) == names:
+            return False
+        self._sources[source] = names
+        self._names = tuple(sorted(set().union(*self._sources.values())))
+        self._json = None
+        self.version += 1
+        return True
+    
+    @property
+    def names(self):
+        return self._names
+    
+    def to_json(self):
+        """Grammatica nel formato di Vosk (lista di frasi, con [unk] per il fuori vocabolario)."""
+        if self._json is None:
+            self._json = json.dumps(self.STATIC_PHRASES + list(self._names) + ['[unk]'], ensure_ascii=False)
+        return self._json
+    
+    def score(self, text):
+        """Quanto il testo è un comando valido: verbo riconosciuto + entità o gruppo noto."""
+        text_lower = text.lower()
+        score = 0
+        if any(verb in text_lower for verb in VOICE_COMMANDS):
+            score += 2
+        if any(name in text_lower for name in self._names):
+            score += 2
+        elif any(phrase in text_lower for phrase in VOICE_ALL_LIGHTS_PHRASES + VOICE_LED_PHRASES):
+            score += 1
+        return score
+    
+    def best_transcript(self, transcripts):
+        """Sceglie tra le alternative quella più aderente alla grammatica (a parità, l'ordine del riconoscitore)."""
+        return max(transcripts, key=self.score)
+
+
+class GoogleRecognizerBackend:
+    """Riconoscimento tramite Google Speech Recognition (richiede internet).
+    
+    Google non accetta una grammatica: con la grammatica si chiedono tutte le
+    alternative e si sceglie quella che corrisponde a un comando valido.
+    """
+    name = 'Google Speech'
+    
+    def __init__(self, language=VOICE_LANGUAGE):
+        self.language = language
+        self.recognizer = sr.Recognizer()
+    
+    def recognize(self, audio, grammar=None):
+        """Ritorna il testo riconosciuto da un sr.AudioData (solleva sr.UnknownValueError / sr.RequestError)."""
+        if grammar is None:
+            return self.recognizer.recognize_google(audio, language=self.language)
+        
+        result = self.recognizer.recognize_google(audio, language=self.language, show_all=True)
+        alternatives = result.get('alternative', []) if isinstance(result, dict) else []
+        transcripts = [alt['transcript'] for alt in alternatives if alt.get('transcript')]
+        if not transcripts:
+            raise sr.UnknownValueError()
+        return grammar.best_transcript(transcripts)
+
+
+class VoskRecognizerBackend:
+    """Riconoscimento offline con Vosk.
+    
+    Il modello viene caricato una sola volta alla creazione e resta in memoria;
+    per ogni comando si crea solo un KaldiRecognizer, che è leggero.
+    """
+    name = 'Vosk (offline)'
+    
+    def __init__(self, model_path=VOSK_MODEL_PATH, sample_rate=VOICE_SAMPLE_RATE):
+        if not VOSK_AVAILABLE:
+            raise RuntimeError("pacchetto 'vosk' non installato")
+        if not os.path.isabs(model_path):
+            model_path = os.path.join(get_base_path(), model_path)
+        if not os.path.isdir(model_path):
+            raise RuntimeError(f"modello Vosk non trovato in '{model_path}'")
+        vosk.SetLogLevel(-1)
+        self.sample_rate = sample_rate
+        self.model = vosk.Model(model_path)
+        self._grammar_recognizer = None  # (versione grammatica, KaldiRecognizer)
+        # Primo passaggio a vuoto: evita che il primo comando paghi l'inizializzazione
+        self._transcribe(vosk.KaldiRecognizer(self.model, self.sample_rate), b'\x00\x00' * (sample_rate // 10))
+    
+    def _transcribe(self, recognizer, pcm_data):
+        recognizer.AcceptWaveform(pcm_data)
+        # FinalResult azzera il riconoscitore, che può essere riutilizzato
+        return json.loads(recognizer.FinalResult()).get('text', '')
+    
+    def _recognizer_for(self, grammar):
+        """Riconoscitore vincolato alla grammatica, ricompilato solo quando la grammatica cambia."""
+        if grammar is None:
+            return vosk.KaldiRecognizer(self.model, self.sample_rate)
+        if self._grammar_recognizer is None or self._grammar_recognizer[0] != grammar.version:
+            recognizer = vosk.KaldiRecognizer(self.model, self.sample_rate, grammar.to_json())
+            self._grammar_recognizer = (grammar.version, recognizer)
+        return self._grammar_recognizer[1]
+    
+    def recognize(self, audio, grammar=None):
+        """Ritorna il testo riconosciuto da un sr.AudioData (solleva sr.UnknownValueError)."""
+        pcm_data = audio.get_raw_data(convert_rate=self.sample_rate, convert_width=2)
+        text = self._transcribe(self._recognizer_for(grammar), pcm_data)
+        # '[unk]' è il segnaposto di Vosk per le parole fuori grammatica
+        text = ' '.join(word for word in text.split() if word != '[unk]')
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+
+
+RECOGNIZER_BACKENDS = {
+    'google': GoogleRecognizerBackend,
+    'vosk': VoskRecognizerBackend,
+}
+
+def create_recognizer_backend(recognizer_config=None):
+    """Crea il backend di riconoscimento configurato, ripiegando su Google in caso di errore."""
+    recognizer_config = recognizer_config or {}
+    name = recognizer_config.get('backend', VOICE_RECOGNIZER)
+    if name == 'vosk':
+        try:
+            return VoskRecognizerBackend(recognizer_config.get('model_path', VOSK_MODEL_PATH))
+        except Exception as e:
+            safe_print(f"⚠️  Riconoscimento offline non disponibile ({e}), uso Google Speech")
+    return GoogleRecognizerBackend(recognizer_config.get('language', VOICE_LANGUAGE))
+
+
+class VoiceActivityRecorder:
+    """Registra un comando vocale da un sounddevice.InputStream con endpointing a energia.
+    
+    La soglia di parlato si adatta al rumore di fondo (media mobile dell'RMS dei
+    blocchi silenziosi). La registrazione termina dopo trailing_silence secondi
+    di silenzio successivi al parlato, o comunque dopo max_duration.
+    """
+    
+    def __init__(self, sample_rate=VOICE_SAMPLE_RATE, max_duration=VOICE_MAX_DURATION,
+                 trailing_silence=VOICE_TRAILING_SILENCE, start_timeout=VOICE_START_TIMEOUT):
+        self.sample_rate = sample_rate
+        self.max_duration = max_duration
+        self.trailing_silence = trailing_silence
+        self.start_timeout = start_timeout
+        self.frame_size = int(sample_rate * VOICE_FRAME_DURATION)
+        self.noise_rms = None
+    
+    def _threshold(self):
+        if self.noise_rms is None:
+            return VOICE_ENERGY_FLOOR
+        return max(VOICE_ENERGY_FLOOR, self.noise_rms * VOICE_NOISE_FACTOR)
+    
+    def _is_speech(self, frame):
+        """Classifica un blocco come parlato e aggiorna la stima del rumore."""
+        rms = float(np.sqrt(np.mean(frame.astype(np.float32) ** 2)))
+        speech = rms > self._threshold()
+        if not speech:
+            self.noise_rms = rms if self.noise_rms is None else 0.9 * self.noise_rms + 0.1 * rms
+        return speech
+    
+    def record(self):
+        """Registra fino a fine parlato. Ritorna l'audio int16 (mono) rifilato, o None se nessun parlato."""
+        frames = queue.Queue()
+        
+        def on_audio(indata, frame_count, time_info, status):
+            frames.put(indata[:, 0].copy())
+        
+        frame_duration = self.frame_size / self.sample_rate
+        pre_roll = collections.deque(maxlen=max(1, int(VOICE_PRE_ROLL / frame_duration)))
+        recorded = []
+        speech_frames = 0
+        silent_frames = 0
+        elapsed = 0.0
+        
+        with sd.InputStream(samplerate=self.sample_rate, channels=1, dtype='int16',
+                            blocksize=self.frame_size, callback=on_audio):
+            while elapsed < self.max_duration:
+                try:
+                    frame = frames.get(timeout=1.0)
+                except queue.Empty:
+                    logger.warning("Nessun audio dal microfono")
+                    break
+                elapsed += len(frame) / self.sample_rate
+                speech = self._is_speech(frame)
+                
+                if not recorded:
+                    # In attesa dell'inizio del parlato
+                    if speech:
+                        recorded.extend(pre_roll)
+                        recorded.append(frame)
+                        speech_frames = 1
+                    elif elapsed >= self.start_timeout:
+                        break
+                    else:
+                        pre_roll.append(frame)
+                    continue
+                
+                recorded.append(frame)
+                if speech:
+                    speech_frames += 1
+                    silent_frames = 0
+                else:
+                    silent_frames += 1
+                    if silent_frames * frame_duration >= self.trailing_silence:
+                        break
+        
+        if speech_frames * frame_duration < VOICE_MIN_SPEECH:
+            return None
+        # Scarta il silenzio finale, tenendone un breve margine per il riconoscitore
+        keep_tail = min(silent_frames, max(1, int(0.2 / frame_duration)))
+        if silent_frames > keep_tail:
+            recorded = recorded[:len(recorded) - (silent_frames - keep_tail)]
+        return np.concatenate(recorded)
+
+
 class VoiceController:
     """Controller principale per il riconoscimento vocale."""
     
-    def __init__(self, ha_instances, ble_mapping, entity_domains=None, group_lights_control=False):
+    def __init__(self, ha_instances, ble_mapping, entity_domains=None, group_lights_control=False, ble_config=None, capture_config=None, recognizer_config=None):
         self.ha_instances = ha_instances  # Lista di istanze HA
         self.ha_url = None
         self.ha_token = None
@@ -352,15 +961,26 @@ class VoiceController:
         self.is_enabled = True
         self.is_listening = False
         self.ble_mapping = ble_mapping
+        self.ble_config = ble_config or {}
         self.entity_domains = entity_domains or ['light']
         self.group_lights_control = group_lights_control
         self.current_room = None
         self.current_room_name = None
         self.current_room_lights = []
         self.room_cache_time = None
-        self.room_cache_duration = 30  # Aumentato a 30s per dare tempo al voice command (registrazione 5s + riconoscimento ~2s)
-        self.recognizer = sr.Recognizer()
+        self.room_cache_duration = 30  # Aumentato a 30s per dare tempo al voice command (registrazione fino a 8s + riconoscimento ~2s)
+        self.recognizer_backend = create_recognizer_backend(recognizer_config)
+        self.command_grammar = CommandGrammar() if (recognizer_config or {}).get('grammar') else None
+        self.entity_index = EntityNameIndex()
+        self.room_indexes = {}  # area_id -> EntityNameIndex delle entità della stanza
+        self._indexed_entities = None
         self.is_connected = False
+        capture_config = capture_config or {}
+        self.capture_mode = capture_config.get('mode', 'vad')
+        self.voice_recorder = VoiceActivityRecorder(
+            max_duration=capture_config.get('max_duration', VOICE_MAX_DURATION),
+            trailing_silence=capture_config.get('trailing_silence', VOICE_TRAILING_SILENCE),
+        )
         
         # Tenta connessione iniziale (non bloccante)
         self._try_connect()
@@ -371,12 +991,12 @@ class VoiceController:
             url = instance['url']
             token = instance['token']
             try:
-                headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-                response = requests.get(f"{url}/api/", headers=headers, timeout=3)
+                response = get_ha_client(url, token).get('/api/', timeout=3)
                 if response.status_code == 200:
                     self.ha_url = url
                     self.ha_token = token
                     self.entities = voice_get_all_entities(url, token)
+                    self._on_entities_changed()
                     self.is_connected = True
                     safe_print(f"✓ Voice Control connesso a {url}")
                     return True
@@ -391,6 +1011,7 @@ class VoiceController:
             self.current_room = None
             self.current_room_name = None
             self.current_room_lights = []
+            self._on_entities_changed()
             return
         
         # Verifica cache
@@ -408,12 +1029,10 @@ class VoiceController:
         try:
             safe_print("📡 Rilevamento stanza...")
             
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            area_id = loop.run_until_complete(
-                voice_detect_current_room(self.ble_mapping, scan_duration=3)
-            )
-            loop.close()
+            # Usa il servizio di presenza condiviso: se la finestra ha appena rilevato
+            # l'area la risposta è immediata, altrimenti dopo 3 secondi vale il beacon più forte
+            presence_service = get_ble_presence_service(self.ble_mapping, self.ble_config)
+            area_id = presence_service.wait_for_area(timeout=3)
             
             if area_id:
                 # Recupera il nome friendly dell'area
@@ -448,6 +1067,25 @@ class VoiceController:
             self.current_room_name = None
             self.current_room_lights = []
             self.room_cache_time = None
+        
+        self._on_entities_changed()
+    
+    def _on_entities_changed(self):
+        """Aggiorna le strutture derivate dalle entità (tutte e della stanza corrente)."""
+        changed = False
+        # La lista globale viene sostituita solo alla (ri)connessione
+        if self.entities is not self._indexed_entities:
+            self._indexed_entities = self.entities
+            self.entity_index.update(self.entities)
+            if self.command_grammar:
+                changed = self.command_grammar.set_entities('all', self.entities, self.entity_domains)
+        
+        if self.current_room:
+            self.room_indexes.setdefault(self.current_room, EntityNameIndex()).update(self.current_room_lights)
+        if self.command_grammar:
+            changed |= self.command_grammar.set_entities('room', self.current_room_lights)
+            if changed:
+                logger.info(f"Grammatica comandi aggiornata: {len(self.command_grammar.names)} nomi (v{self.command_grammar.version})")
     
     def split_multiple_commands(self, text):
         """Divide il testo in comandi multipli se contiene 'e' o 'and'.
@@ -471,24 +1109,7 @@ class VoiceController:
         """
         text_lower = text.lower().strip()
         
-        commands = {
-            # Italiano
-            'accendi': 'turn_on',
-            'accenda': 'turn_on',
-            'attiva': 'turn_on',
-            'spegni': 'turn_off',
-            'spegna': 'turn_off',
-            'disattiva': 'turn_off',
-            'apri': 'open_cover',
-            'chiudi': 'close_cover',
-            # Inglese
-            'turn on': 'turn_on',
-            'switch on': 'turn_on',
-            'turn off': 'turn_off',
-            'switch off': 'turn_off',
-            'open': 'open_cover',
-            'close': 'close_cover',
-        }
+        commands = VOICE_COMMANDS
         
         action = None
         entity_name = None
@@ -496,12 +1117,7 @@ class VoiceController:
         # Controlla prima i comandi di gruppo (se abilitati)
         if self.group_lights_control:
             # Pattern per "tutte le luci" o generico "le luci" (IT + EN)
-            if any(phrase in text_lower for phrase in [
-                # Italiano
-                'tutte le luci', 'tutte le luce', 'tutte luci', 'le luci', 'la luce',
-                # Inglese
-                'all lights', 'all the lights', 'the lights'
-            ]):
+            if any(phrase in text_lower for phrase in VOICE_ALL_LIGHTS_PHRASES):
                 for keyword, cmd in commands.items():
                     if keyword in text_lower:
                         return cmd, 'all_lights'
@@ -515,12 +1131,7 @@ class VoiceController:
             
             # Pattern per "luce led" / "luci led" / "led" (IT + EN)
             # Controllo più specifico prima, poi quelli generici
-            if any(phrase in text_lower for phrase in [
-                # Italiano - specifici
-                'tutti i led', 'tutte le led', 'luce led', 'luci led', 'le led', 'i led',
-                # Inglese - specifici
-                'led lights', 'led light', 'the led', 'the leds', 'all leds'
-            ]):
+            if any(phrase in text_lower for phrase in VOICE_LED_PHRASES):
                 for keyword, cmd in commands.items():
                     if keyword in text_lower:
                         return cmd, 'led_lights'
@@ -564,19 +1175,27 @@ class VoiceController:
             play_beep(800, 60)
             safe_print("\n🎤 Ascolto attivo... Parla ora!")
             
-            duration = 5
-            sample_rate = 16000
+            sample_rate = VOICE_SAMPLE_RATE
             
             try:
-                safe_print(f"⏺️  Registrazione in corso ({duration} secondi)...")
-                
-                audio_data = sd.rec(int(duration * sample_rate), 
-                                   samplerate=sample_rate, 
-                                   channels=1, 
-                                   dtype='int16')
-                sd.wait()
+                if self.capture_mode == 'fixed':
+                    duration = VOICE_FIXED_DURATION
+                    safe_print(f"⏺️  Registrazione in corso ({duration:.0f} secondi)...")
+                    
+                    audio_data = sd.rec(int(duration * sample_rate), 
+                                       samplerate=sample_rate, 
+                                       channels=1, 
+                                       dtype='int16')
+                    sd.wait()
+                else:
+                    safe_print("⏺️  Registrazione in corso (si ferma quando smetti di parlare)...")
+                    audio_data = self.voice_recorder.record()
+                    if audio_data is None:
+                        safe_print("✗ Nessun comando rilevato, riprova")
+                        play_beep(500, 150)
+                        return
                 
-                safe_print("✓ Registrazione completata")
+                safe_print(f"✓ Registrazione completata ({len(audio_data) / sample_rate:.1f}s)")
                 
                 max_amplitude = np.max(np.abs(audio_data))
                 if max_amplitude < 100:
@@ -585,8 +1204,8 @@ class VoiceController:
                 audio_bytes = audio_data.tobytes()
                 audio = sr.AudioData(audio_bytes, sample_rate, 2)
                 
-                safe_print("🔍 Riconoscimento in corso (Google Speech)...")
-                text = self.recognizer.recognize_google(audio, language='it-IT')
+                safe_print(f"🔍 Riconoscimento in corso ({self.recognizer_backend.name})...")
+                text = self.recognizer_backend.recognize(audio, self.command_grammar)
                 
                 safe_print(f"✓ Riconosciuto: '{text}'")
                 
@@ -619,7 +1238,7 @@ class VoiceController:
                 safe_print("✗ Non ho capito, riprova")
                 play_beep(500, 150)
             except sr.RequestError as e:
-                safe_print(f"✗ Errore servizio Google: {e}")
+                safe_print(f"✗ Errore servizio {self.recognizer_backend.name}: {e}")
                 play_beep(500, 200)
             except Exception as recogn_error:
                 safe_print(f"✗ Errore riconoscimento: {recogn_error}")
@@ -705,7 +1324,10 @@ class VoiceController:
         
         # Gestione normale per singola entità
         else:
-            entity_id = voice_find_entity_by_name(self.entities, entity_name, self.current_room_lights, self.entity_domains)
+            entity_id = voice_find_entity_by_name(
+                self.entities, entity_name, self.current_room_lights, self.entity_domains,
+                entity_index=self.entity_index, room_index=self.room_indexes.get(self.current_room)
+            )
             
             if entity_id:
                 room_info = f" nella stanza {self.current_room_name}" if self.current_room_name else ""
@@ -733,15 +1355,21 @@ class VoiceController:
 class VoiceControlAgent:
     """Agent per il controllo vocale, integrato in smart_proximity_control."""
     
-    def __init__(self, ha_instances, ble_mapping=None, entity_domains=None, hotkey='ctrl+shift+i', group_lights_control=False):
+    def __init__(self, ha_instances, ble_mapping=None, entity_domains=None, hotkey='ctrl+shift+i', group_lights_control=False, ble_config=None, capture_config=None, recognizer_config=None):
         self.ha_instances = ha_instances  # Lista di istanze HA
         self.group_lights_control = group_lights_control
         self.ble_mapping = ble_mapping
+        self.ble_config = ble_config
+        self.capture_config = capture_config
+        self.recognizer_config = recognizer_config
         self.entity_domains = entity_domains or ['light']
         self.hotkey = hotkey
         self.is_running = False
         self.controller = None
         self._hotkey_registered = False
+        # Un solo worker dedicato: l'ascolto non occupa il pool di I/O condiviso
+        self._voice_executor = None
+        self._voice_future = None  # ascolto in corso, le hotkey premute nel frattempo vengono ignorate
     
     def start(self):
         """Avvia l'agent e registra la hotkey."""
@@ -749,7 +1377,8 @@ class VoiceControlAgent:
             return False
         
         try:
-            self.controller = VoiceController(self.ha_instances, self.ble_mapping, self.entity_domains, self.group_lights_control)
+            self.controller = VoiceController(self.ha_instances, self.ble_mapping, self.entity_domains, self.group_lights_control, self.ble_config, self.capture_config, self.recognizer_config)
+            self._voice_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='spc-voice')
             
             keyboard.add_hotkey(self.hotkey, self._on_hotkey, suppress=False)
             self._hotkey_registered = True
@@ -774,6 +1403,10 @@ class VoiceControlAgent:
         except:
             pass
         
+        if self._voice_executor:
+            self._voice_executor.shutdown(wait=False, cancel_futures=True)
+            self._voice_executor = None
+            self._voice_future = None
         self.is_running = False
         self.controller = None
     
@@ -781,6 +1414,9 @@ class VoiceControlAgent:
         """Callback per la hotkey."""
         if not self.is_running or not self.controller:
             return
+        if self._voice_future is not None and not self._voice_future.done():
+            logger.info("Ascolto già in corso, ignoro la hotkey")
+            return
         
         safe_print("\n>>> Voice hotkey rilevata!")
         
@@ -792,10 +1428,9 @@ class VoiceControlAgent:
                 play_beep(500, 200)
                 return
         
-        if self.controller.ble_mapping:
-            threading.Thread(target=self._detect_and_listen, daemon=True).start()
-        else:
-            threading.Thread(target=self.controller.listen_and_execute, daemon=True).start()
+        task = self._detect_and_listen if self.controller.ble_mapping else self.controller.listen_and_execute
+        self._voice_future = self._voice_executor.submit(task)
+        self._voice_future.add_done_callback(AsyncRuntime._log_exception)
     
     def _detect_and_listen(self):
         """Rileva la stanza e poi avvia l'ascolto."""
@@ -815,11 +1450,7 @@ class VoiceControlAgent:
 def test_ha_connection(url, token, timeout=3):
     """Test connection to a Home Assistant instance."""
     try:
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json",
-        }
-        response = requests.get(f"{url}/api/", headers=headers, timeout=timeout)
+        response = get_ha_client(url, token).get('/api/', timeout=timeout)
         if response.status_code == 200:
             api_info = response.json()
             safe_print(f"✓ Connected to Home Assistant at {url} (version {api_info.get('version', 'unknown')})")
@@ -847,37 +1478,111 @@ def detect_available_instance(ha_instances, current_url=None):
     
     safe_print(f"\nTesting {len(ha_instances)} Home Assistant instance(s)...")
     
-    # Se abbiamo un URL corrente, testalo per primo
-    if current_url:
-        for instance in ha_instances:
-            if instance['url'] == current_url:
-                safe_print(f"\nTesting current instance: {current_url}")
-                if test_ha_connection(current_url, instance['token'], timeout=2):
+    # Ordine di priorità: prima l'istanza corrente, poi quelle configurate
+    candidates = sorted(ha_instances, key=lambda instance: instance['url'] != current_url)
+    
+    # Testa tutte le istanze in parallelo: il caso peggiore è un solo timeout
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(candidates), thread_name_prefix='ha-probe')
+    probes = [
+        executor.submit(test_ha_connection, instance['url'], instance['token'],
+                        2 if instance['url'] == current_url else 3)
+        for instance in candidates
+    ]
+    try:
+        # Vince la prima istanza raggiungibile in ordine di priorità: si attende
+        # un'istanza solo se tutte quelle con priorità maggiore hanno fallito
+        for instance, probe in zip(candidates, probes):
+            if probe.result():
+                if instance['url'] == current_url:
                     safe_print(f"\n✓ Current instance still available: {current_url}\n")
-                    return current_url, instance['token']
                 else:
-                    safe_print(f"\n✗ Current instance {current_url} no longer available, trying others...")
-                break
-    
-    # Testa tutte le istanze
-    for i, instance in enumerate(ha_instances, 1):
-        url = instance['url']
-        token = instance['token']
-        
-        # Salta l'istanza corrente se già testata
-        if url == current_url:
-            continue
-            
-        safe_print(f"\nTesting instance {i}/{len(ha_instances)}: {url}")
-        
-        if test_ha_connection(url, token):
-            safe_print(f"\n✓ Using Home Assistant instance: {url}\n")
-            return url, token
+                    safe_print(f"\n✓ Using Home Assistant instance: {instance['url']}\n")
+                return instance['url'], instance['token']
+    finally:
+        # Le verifiche ancora in corso terminano da sole entro il loro timeout
+        for probe in probes:
+            probe.cancel()
+        executor.shutdown(wait=False)
     
     safe_print("\n✗ No Home Assistant instances are reachable!")
     safe_print("Please check your network connection and configuration.\n")
     return None, None
 
+HA_HEALTH_CHECK_INTERVAL = 60  # secondi tra due verifiche periodiche in background
+HA_HEALTH_MAX_AGE = 10         # secondi dopo i quali l'esito in cache va rivalidato
+
+class HAHealthMonitor:
+    """Stato di salute delle istanze Home Assistant, mantenuto in background.
+    
+    Conserva l'ultima istanza funzionante con l'orario della verifica. I percorsi
+    critici (hotkey, rilevamento area) leggono solo la cache con snapshot() e,
+    se l'esito è vecchio, chiedono una rivalidazione asincrona con revalidate().
+    I listener ricevono (url, token) quando l'istanza cambia, (None, None)
+    quando nessuna istanza è raggiungibile.
+    """
+
+    def __init__(self, ha_instances, url=None, token=None,
+                 interval=HA_HEALTH_CHECK_INTERVAL, max_age=HA_HEALTH_MAX_AGE):
+        self.ha_instances = ha_instances
+        self.interval = interval
+        self.max_age = max_age
+        self.url = url
+        self.token = token
+        self.available = bool(url)
+        self.checked_at = time.monotonic() if url else None
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._pending = None
+        self._future = None
+
+    def add_listener(self, callback):
+        with self._lock:
+            self._listeners.append(callback)
+
+    def snapshot(self):
+        """Ritorna (url, token, available, fresh) senza eseguire richieste."""
+        with self._lock:
+            fresh = self.checked_at is not None and time.monotonic() - self.checked_at < self.max_age
+            return self.url, self.token, self.available, fresh
+
+    def revalidate(self):
+        """Avvia una verifica in background (una sola alla volta) e ne ritorna il future."""
+        with self._lock:
+            if self._pending is None or self._pending.done():
+                self._pending = get_async_runtime().run_blocking(self._check)
+            return self._pending
+
+    def start(self):
+        """Avvia le verifiche periodiche sul loop persistente."""
+        if self._future is None:
+            self._future = get_async_runtime().submit(self._run())
+
+    def stop(self):
+        if self._future:
+            self._future.cancel()
+            self._future = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wrap_future(self.revalidate())
+            except Exception as e:
+                logger.error(f"Errore verifica istanze Home Assistant: {e}")
+            await asyncio.sleep(self.interval)
+
+    def _check(self):
+        new_url, new_token = detect_available_instance(self.ha_instances, self.url)
+        with self._lock:
+            changed = bool(new_url) != self.available or (new_url and new_url != self.url)
+            if new_url:
+                self.url, self.token = new_url, new_token
+            self.available = bool(new_url)
+            self.checked_at = time.monotonic()
+            listeners = list(self._listeners) if changed else []
+        for callback in listeners:
+            callback(new_url, new_token)
+        return new_url, new_token
+
 def singleton():
     """Ensures that only one instance of the program is running."""
     lock_file_path = os.path.join(tempfile.gettempdir(), 'hapy.lock')
@@ -918,7 +1623,7 @@ def carica_configurazione(file_path='config.ini'):
         safe_print("url = http://your-home-assistant-ip:8123")
         safe_print("api_token = your_long_lived_access_token\n")
         safe_print("For more details, please read the README.md file.")
-        return None, None, None, None, None, None, None
+        return None, None, None, None, None, None, None, None, None
 
     config = configparser.ConfigParser()
     config.read(file_path)
@@ -933,11 +1638,11 @@ def carica_configurazione(file_path='config.ini'):
         if not ha_url.startswith(('http://', 'https://')):
             safe_print(f"Error: URL must start with http:// or https://")
             safe_print(f"Current value: {ha_url}")
-            return None, None, None, None, None, None
+            return None, None, None, None, None, None, None, None, None
         
         if len(ha_token) < 50:
             safe_print(f"Error: API token seems too short. Make sure you're using a Long-Lived Access Token.")
-            return None, None, None, None, None, None
+            return None, None, None, None, None, None, None, None, None
         
         ha_instances.append({'url': ha_url, 'token': ha_token})
         
@@ -981,20 +1686,66 @@ def carica_configurazione(file_path='config.ini'):
             'entity_domains': config.get('home_assistant', 'entity_domains', fallback='light').split(','),
             'group_lights_control': config.getboolean('home_assistant', 'group_lights_control', fallback=False),
             'show_hotkey': config.get('home_assistant', 'show_hotkey', fallback='ctrl+shift+space'),
-            'quit_hotkey': config.get('home_assistant', 'quit_hotkey', fallback='ctrl+shift+q')
+            'quit_hotkey': config.get('home_assistant', 'quit_hotkey', fallback='ctrl+shift+q'),
+            'capture': {
+                'mode': config.get('home_assistant', 'voice_capture', fallback='vad').strip().lower(),
+                'max_duration': config.getfloat('home_assistant', 'voice_max_duration', fallback=VOICE_MAX_DURATION),
+                'trailing_silence': config.getfloat('home_assistant', 'voice_trailing_silence', fallback=VOICE_TRAILING_SILENCE),
+            },
+            'recognizer': {
+                'backend': config.get('home_assistant', 'voice_recognizer', fallback=VOICE_RECOGNIZER).strip().lower(),
+                'language': config.get('home_assistant', 'voice_language', fallback=VOICE_LANGUAGE).strip(),
+                'model_path': config.get('home_assistant', 'voice_model_path', fallback=VOSK_MODEL_PATH).strip(),
+                'grammar': config.getboolean('home_assistant', 'voice_grammar', fallback=False),
+            },
         }
         voice_config['entity_domains'] = [d.strip() for d in voice_config['entity_domains']]
+        if voice_config['capture']['mode'] not in ('vad', 'fixed'):
+            safe_print(f"Warning: Unknown voice_capture '{voice_config['capture']['mode']}', using 'vad'")
+            voice_config['capture']['mode'] = 'vad'
+        if voice_config['recognizer']['backend'] not in RECOGNIZER_BACKENDS:
+            safe_print(f"Warning: Unknown voice_recognizer '{voice_config['recognizer']['backend']}', using '{VOICE_RECOGNIZER}'")
+            voice_config['recognizer']['backend'] = VOICE_RECOGNIZER
         
         # Impostazione suoni
         enable_sounds = config.getboolean('home_assistant', 'enable_sounds', fallback=True)
         
-        return ha_instances, app_title, icon_size, show_tooltips, entity_domains_list, voice_config, enable_sounds
+        # Impostazioni scanner BLE (opzionali)
+        ble_config = {
+            'dominance_margin_db': config.getfloat('ble', 'dominance_margin_db', fallback=BLE_DOMINANCE_MARGIN_DB),
+            'single_scan_timeout': config.getfloat('ble', 'single_scan_timeout', fallback=BLE_SINGLE_SCAN_TIMEOUT),
+            'early_exit_advertisements': config.getint('ble', 'early_exit_advertisements', fallback=BLE_EARLY_EXIT_ADVERTISEMENTS),
+            'rssi_filter': config.get('ble', 'rssi_filter', fallback=BLE_RSSI_FILTER).strip().lower(),
+            'switch_margin_db': config.getfloat('ble', 'switch_margin_db', fallback=BLE_SWITCH_MARGIN_DB),
+            'dwell_time': config.getfloat('ble', 'dwell_time', fallback=BLE_DWELL_TIME),
+        }
+        ble_filter_params = {
+            'none': {},
+            'ewma': {'alpha': config.getfloat('ble', 'ewma_alpha', fallback=0.3)},
+            'kalman': {
+                'process_noise': config.getfloat('ble', 'kalman_process_noise', fallback=0.5),
+                'measurement_noise': config.getfloat('ble', 'kalman_measurement_noise', fallback=4.0),
+            },
+            'median': {'window': config.getint('ble', 'median_window', fallback=5)},
+        }
+        if ble_config['rssi_filter'] not in ble_filter_params:
+            safe_print(f"Warning: Unknown BLE rssi_filter '{ble_config['rssi_filter']}', using '{BLE_RSSI_FILTER}'")
+            ble_config['rssi_filter'] = BLE_RSSI_FILTER
+        ble_config['rssi_filter_params'] = ble_filter_params[ble_config['rssi_filter']]
+        
+        # Impostazioni client Home Assistant (opzionali)
+        ha_config = {
+            'use_websocket': config.getboolean('home_assistant', 'use_websocket', fallback=True),
+            'prefetch_areas': config.getboolean('home_assistant', 'prefetch_areas', fallback=False),
+        }
+        
+        return ha_instances, app_title, icon_size, show_tooltips, entity_domains_list, voice_config, enable_sounds, ble_config, ha_config
     except (configparser.NoSectionError, configparser.NoOptionError) as e:
         safe_print(f"Error: The configuration file '{file_path}' is invalid.")
         safe_print(f"Make sure it contains a [home_assistant] section with 'url' and 'api_token' keys.")
         safe_print(f"Error details: {e}")
         safe_print("\nPlease refer to README.md for configuration instructions.")
-        return None, None, None, None, None, None, None
+        return None, None, None, None, None, None, None, None, None
 
 def carica_mappatura_ble(file_path=BLE_ENTITY_FILE):
     """Carica la mappatura dei dispositivi BLE con gli ID area."""
@@ -1023,38 +1774,156 @@ def carica_mappatura_ble(file_path=BLE_ENTITY_FILE):
         safe_print(f"Error loading BLE entity file: {e}")
         return None
 
+HA_REGISTRY_TTL = 300  # secondi di validità del registro aree/entità in cache
+HA_PREFETCH_INTERVAL = 120  # secondi tra due precaricamenti delle aree mappate
+HA_STATES_FRESH_AGE = 5  # secondi entro cui uno stato in cache viene mostrato come definitivo
+HA_REGISTRY_EVENTS = ('area_registry_updated', 'entity_registry_updated', 'device_registry_updated')
+
+class HARegistryCache:
+    """Cache in memoria del registro di una istanza Home Assistant.
+    
+    Conserva nomi delle aree, entity_id per area e metadati delle entità
+    (friendly_name, dominio). Ogni voce scade dopo ttl secondi; gli eventi
+    *_registry_updated ricevuti dal WebSocket invalidano le voci interessate.
+    """
+
+    def __init__(self, url, ttl=HA_REGISTRY_TTL):
+        self.url = url
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._area_names = {}     # area_id -> (nome, istante di caricamento)
+        self._area_entities = {}  # area_id -> (lista entity_id, istante di caricamento)
+        self._entities = {}       # entity_id -> {'friendly_name': ..., 'domain': ...}
+        self._states = {}         # entity_id -> stato completo dell'ultimo /api/states
+        self._entities_loaded_at = None
+
+    def _is_valid(self, loaded_at):
+        return loaded_at is not None and time.monotonic() - loaded_at < self.ttl
+
+    def get_area_name(self, area_id):
+        with self._lock:
+            name, loaded_at = self._area_names.get(area_id, (None, None))
+            return name if self._is_valid(loaded_at) else None
+
+    def set_area_names(self, area_names):
+        now = time.monotonic()
+        with self._lock:
+            for area_id, name in area_names.items():
+                self._area_names[area_id] = (name, now)
+
+    def get_area_entity_ids(self, area_id):
+        with self._lock:
+            entity_ids, loaded_at = self._area_entities.get(area_id, (None, None))
+            return list(entity_ids) if self._is_valid(loaded_at) else None
+
+    def set_area_entity_ids(self, area_id, entity_ids):
+        with self._lock:
+            self._area_entities[area_id] = (list(entity_ids), time.monotonic())
+
+    def entities_valid(self):
+        """True se i metadati delle entità (da /api/states) sono ancora validi."""
+        with self._lock:
+            return self._is_valid(self._entities_loaded_at)
+
+    def get_entity(self, entity_id):
+        with self._lock:
+            return self._entities.get(entity_id)
+
+    def get_states(self, entity_ids, max_age=None):
+        """Ritorna gli ultimi stati noti, caricati da non più di max_age secondi (default: ttl)."""
+        max_age = self.ttl if max_age is None else max_age
+        with self._lock:
+            if self._entities_loaded_at is None or time.monotonic() - self._entities_loaded_at >= max_age:
+                return {}
+            return {entity_id: self._states[entity_id] for entity_id in entity_ids if entity_id in self._states}
+
+    def set_entities(self, states):
+        """Aggiorna i metadati di tutte le entità a partire dalla risposta di /api/states."""
+        entities = {}
+        for state in states:
+            entity_id = state['entity_id']
+            entities[entity_id] = {
+                'friendly_name': state.get('attributes', {}).get('friendly_name', entity_id.replace('_', ' ').title()),
+                'domain': entity_id.split('.')[0],
+            }
+        with self._lock:
+            self._entities = entities
+            self._states = {state['entity_id']: state for state in states}
+            self._entities_loaded_at = time.monotonic()
+
+    def invalidate(self):
+        """Scarta tutte le voci (aree, entità e stati)."""
+        with self._lock:
+            self._area_names.clear()
+            self._area_entities.clear()
+            self._entities_loaded_at = None
+
+    def handle_event(self, event_type, data):
+        """Invalida le voci toccate da un evento *_registry_updated."""
+        with self._lock:
+            if event_type == 'area_registry_updated':
+                self._area_names.pop(data.get('area_id'), None)
+                self._area_entities.clear()
+            elif event_type == 'entity_registry_updated':
+                # Un'entità creata, rinominata o spostata cambia aree e metadati
+                self._area_entities.clear()
+                self._entities_loaded_at = None
+            elif event_type == 'device_registry_updated':
+                # Le entità ereditano l'area dal dispositivo
+                self._area_entities.clear()
+            else:
+                return
+        logger.info(f"Cache registro invalidata da evento {event_type}")
+
+_ha_registry_caches = {}
+_ha_registry_lock = threading.Lock()
+
+def get_registry_cache(url=None):
+    """Ritorna la cache del registro per l'istanza indicata (default: istanza corrente)."""
+    url = url or HOME_ASSISTANT_URL
+    with _ha_registry_lock:
+        cache = _ha_registry_caches.get(url)
+        if cache is None:
+            cache = HARegistryCache(url)
+            _ha_registry_caches[url] = cache
+        return cache
+
 def get_area_info(area_id):
-    """Recupera informazioni su un'area dato l'ID."""
+    """Recupera informazioni su un'area dato l'ID (usando la cache del registro)."""
+    cache = get_registry_cache()
+    area_name = cache.get_area_name(area_id)
+    if area_name is not None:
+        return {'name': area_name, 'id': area_id}
+    
     try:
-        url = f"{HOME_ASSISTANT_URL}/api/config/area_registry"
-        response = requests.get(url, headers=HEADERS, timeout=5)
+        client = get_ha_client()
+        response = client.get('/api/config/area_registry')
         
         if response.status_code == 200:
             areas = response.json()
-            for area in areas:
-                if area.get('area_id') == area_id:
-                    return {
-                        'name': area.get('name', area_id),
-                        'id': area_id
-                    }
+            # Tiene in cache tutte le aree, non solo quella richiesta
+            cache.set_area_names({area.get('area_id'): area.get('name', area.get('area_id')) for area in areas})
+            area_name = cache.get_area_name(area_id)
+            if area_name is not None:
+                return {'name': area_name, 'id': area_id}
             # Area non trovata nel registry
             return {'name': area_id, 'id': area_id}
         
         elif response.status_code == 404:
             # API area_registry non disponibile, usa template Jinja2
             logger.info(f"Area registry API not available, using template for area {area_id}")
-            template_url = f"{HOME_ASSISTANT_URL}/api/template"
             
             # Ottieni il nome dell'area usando il template
             name_template = f"{{{{ area_name('{area_id}') }}}}"
-            name_response = requests.post(template_url, headers=HEADERS,
-                                         json={"template": name_template}, timeout=5)
+            name_response = client.post('/api/template', json={"template": name_template})
             
             if name_response.status_code == 200:
                 area_name = name_response.text.strip()
                 # Se il template ritorna l'area_id stesso, l'area non esiste
                 if area_name and area_name != area_id:
+                    cache.set_area_names({area_id: area_name})
                     return {'name': area_name, 'id': area_id}
+                cache.set_area_names({area_id: area_id})
             
             return {'name': area_id, 'id': area_id}
         
@@ -1071,18 +1940,11 @@ def get_area_ids(ha_url=None, ha_token=None):
     Se chiamata senza parametri, usa le variabili globali.
     Utile per vedere tutte le aree disponibili.
     """
-    url = ha_url or HOME_ASSISTANT_URL
-    token = ha_token or API_TOKEN
-    
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json",
-    }
+    client = get_ha_client(ha_url, ha_token)
     
     try:
         # Prova prima con area_registry (versioni più recenti di HA)
-        api_url = f"{url}/api/config/area_registry"
-        response = requests.get(api_url, headers=headers, timeout=5)
+        response = client.get('/api/config/area_registry')
         
         if response.status_code == 200:
             areas = response.json()
@@ -1096,9 +1958,8 @@ def get_area_ids(ha_url=None, ha_token=None):
         elif response.status_code == 404:
             # Fallback: usa il template areas()
             safe_print("\n⚠ Area registry non disponibile, uso template Jinja2...")
-            template_url = f"{url}/api/template"
             template = "{{ areas() }}"
-            template_response = requests.post(template_url, headers=headers, json={"template": template}, timeout=5)
+            template_response = client.post('/api/template', json={"template": template})
             
             if template_response.status_code == 200:
                 area_ids = eval(template_response.text)
@@ -1107,7 +1968,7 @@ def get_area_ids(ha_url=None, ha_token=None):
                 for area_id in area_ids:
                     # Ottieni il nome usando area_name()
                     name_template = f"{{{{ area_name('{area_id}') }}}}"
-                    name_response = requests.post(template_url, headers=headers, json={"template": name_template}, timeout=5)
+                    name_response = client.post('/api/template', json={"template": name_template})
                     name = name_response.text.strip() if name_response.status_code == 200 else area_id
                     safe_print(f"  ID: {area_id:<20} Nome: {name}")
                 safe_print("=" * 60)
@@ -1134,20 +1995,24 @@ def get_entities_for_area(area_id, allowed_domains=None):
         allowed_domains = ['light']
     
     entities = []
+    cache = get_registry_cache()
     
     try:
-        # Usa il template di HA per ottenere le entità dell'area
-        # area_entities(area_name_or_id) funziona sia con nome che con ID
-        template = f"{{{{ area_entities('{area_id}') }}}}"
-        
-        template_url = f"{HOME_ASSISTANT_URL}/api/template"
-        template_payload = {"template": template}
-        
-        template_response = requests.post(template_url, headers=HEADERS, json=template_payload, timeout=5)
-        template_response.raise_for_status()
-        
-        # Il template restituisce una lista di entity_id
-        area_entity_ids = eval(template_response.text)  # Converte la stringa lista in lista Python
+        client = get_ha_client()
+        area_entity_ids = cache.get_area_entity_ids(area_id)
+        
+        if area_entity_ids is None:
+            # Usa il template di HA per ottenere le entità dell'area
+            # area_entities(area_name_or_id) funziona sia con nome che con ID
+            template = f"{{{{ area_entities('{area_id}') }}}}"
+            template_payload = {"template": template}
+            
+            template_response = client.post('/api/template', json=template_payload)
+            template_response.raise_for_status()
+            
+            # Il template restituisce una lista di entity_id
+            area_entity_ids = eval(template_response.text)  # Converte la stringa lista in lista Python
+            cache.set_area_entity_ids(area_id, area_entity_ids)
         
         logger.info(f"Trovate {len(area_entity_ids)} entità totali nell'area '{area_id}'")
         
@@ -1155,25 +2020,22 @@ def get_entities_for_area(area_id, allowed_domains=None):
             logger.warning(f"Nessuna entità trovata per l'area '{area_id}'")
             return []
         
-        # Ottieni lo stato di tutte le entità
-        states_url = f"{HOME_ASSISTANT_URL}/api/states"
-        states_response = requests.get(states_url, headers=HEADERS, timeout=5)
-        states_response.raise_for_status()
-        all_states = states_response.json()
-        
-        # Crea un dizionario entity_id -> state per accesso veloce
-        states_dict = {s['entity_id']: s for s in all_states}
+        # Metadati di tutte le entità: una sola richiesta /api/states, poi dalla cache
+        if not cache.entities_valid():
+            states_response = client.get('/api/states')
+            states_response.raise_for_status()
+            cache.set_entities(states_response.json())
         
         # Filtra per dominio
         for entity_id in area_entity_ids:
             domain = entity_id.split('.')[0]
             
             if domain in allowed_domains:
-                state = states_dict.get(entity_id)
-                if state:
+                metadata = cache.get_entity(entity_id)
+                if metadata:
                     entities.append({
                         'entity_id': entity_id,
-                        'alias': state.get('attributes', {}).get('friendly_name', entity_id.replace('_', ' ').title())
+                        'alias': metadata['friendly_name']
                     })
                     logger.info(f"Aggiunta entità: {entity_id}")
         
@@ -1184,81 +2046,734 @@ def get_entities_for_area(area_id, allowed_domains=None):
         logger.error(f"Error getting entities for area '{area_id}': {e}")
         return []
 
-async def ble_scanner_task(ble_mapping, callback, stop_event, single_scan=False):
-    """Task asincrono che scansiona i dispositivi BLE e trova quello con segnale più forte.
+def prefetch_areas(area_ids, allowed_domains=None):
+    """Precarica nomi, entità e stati di più aree con due sole richieste.
     
-    Args:
-        ble_mapping: Dizionario {mac: area_id}
-        callback: Funzione da chiamare con area_id quando trovato
-        stop_event: Event per fermare la scansione
-        single_scan: Se True, fa una sola scansione e ritorna
+    Un unico template restituisce la mappa JSON area -> {nome, entità} e un
+    unico /api/states fornisce metadati e stati: entrambi finiscono nella cache
+    del registro e nello snapshot su disco.
+    Ritorna True se il precaricamento è riuscito.
     """
-    target_macs = {mac.upper(): area_id for mac, area_id in ble_mapping.items()}
+    if allowed_domains is None:
+        allowed_domains = ['light']
+    area_ids = list(area_ids)
+    if not area_ids:
+        return True
     
-    while not stop_event.is_set():
-        logger.info("Avvio scansione BLE per trovare dispositivo più vicino...")
-        safe_print("Scansione BLE in corso...")
+    template = (
+        "{ {%- for area_id in " + json.dumps(area_ids) + " %}"
+        "{{ area_id | tojson }}: {\"name\": {{ area_name(area_id) | tojson }}, "
+        "\"entities\": {{ area_entities(area_id) | tojson }}}"
+        "{%- if not loop.last %}, {% endif %}{%- endfor %} }"
+    )
+    
+    client = get_ha_client()
+    cache = get_registry_cache()
+    try:
+        template_response = client.post('/api/template', json={"template": template})
+        template_response.raise_for_status()
+        areas = json.loads(template_response.text)
         
-        strongest_device = None
-        strongest_rssi = -1000  # Valore molto basso
+        states_response = client.get('/api/states', timeout=10)
+        states_response.raise_for_status()
+        cache.set_entities(states_response.json())
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logger.error(f"Error prefetching areas: {e}")
+        return False
+    
+    cache.set_area_names({area_id: info.get('name') or area_id for area_id, info in areas.items()})
+    for area_id, info in areas.items():
+        cache.set_area_entity_ids(area_id, info.get('entities') or [])
+    
+    # Le entità filtrate ora arrivano dalla cache, senza altre richieste
+    store = get_area_snapshot_store()
+    for area_id, info in areas.items():
+        entities = get_entities_for_area(area_id, allowed_domains)
+        if entities:
+            store.put(client.url, area_id, info.get('name') or area_id, allowed_domains, entities)
+    
+    logger.info(f"Precaricate {len(areas)} aree da {client.url}")
+    return True
+
+class AreaSnapshotStore:
+    """Snapshot su disco delle entità risolte per ogni area, per istanza.
+    
+    Permette di mostrare subito le entità di un'area all'avvio (o dopo il cleanup
+    dei dispositivi) mentre i dati aggiornati vengono scaricati in background.
+    Formato: {url: {area_id: {"name", "domains", "entities": [{entity_id, alias}]}}}
+    """
+
+    def __init__(self, file_path=AREA_SNAPSHOT_FILE):
+        self.path = os.path.join(get_base_path(), file_path)
+        self._lock = threading.Lock()
+        self._data = None
+
+    def _load(self):
+        if self._data is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as file:
+                    self._data = json.load(file)
+            except FileNotFoundError:
+                self._data = {}
+            except Exception as e:
+                logger.warning(f"Snapshot aree non leggibile, lo ricreo: {e}")
+                self._data = {}
+        return self._data
+
+    def get(self, url, area_id, domains):
+        """Ritorna lo snapshot dell'area ({'name', 'entities'}) o None se assente o per altri domini."""
+        with self._lock:
+            snapshot = self._load().get(url, {}).get(area_id)
+        if not snapshot or snapshot.get('domains') != list(domains):
+            return None
+        return snapshot
+
+    def put(self, url, area_id, area_name, domains, entities):
+        """Aggiorna lo snapshot di un'area e lo salva su disco (solo se cambiato)."""
+        snapshot = {
+            'name': area_name,
+            'domains': list(domains),
+            'entities': [{'entity_id': item['entity_id'], 'alias': item['alias']} for item in entities],
+        }
+        with self._lock:
+            areas = self._load().setdefault(url, {})
+            if areas.get(area_id) == snapshot:
+                return
+            areas[area_id] = snapshot
+            try:
+                # Scrittura atomica: file temporaneo e poi sostituzione
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as file:
+                    json.dump(self._data, file, ensure_ascii=False, separators=(',', ':'))
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.warning(f"Impossibile salvare lo snapshot aree: {e}")
+
+_area_snapshot_store = None
+
+def get_area_snapshot_store():
+    """Ritorna lo snapshot delle aree condiviso dal processo."""
+    global _area_snapshot_store
+    if _area_snapshot_store is None:
+        _area_snapshot_store = AreaSnapshotStore()
+    return _area_snapshot_store
+
+# Parametri di default per lo scanner BLE in streaming
+BLE_DOMINANCE_MARGIN_DB = 6.0     # dB di vantaggio sul secondo beacon per considerarlo dominante
+BLE_SETTLE_TIME = 0.3             # secondi prima di accettare un beacon senza concorrenti
+BLE_SINGLE_BEACON_MIN_TIME = 1.5  # scansione singola: secondi prima che un beacon senza concorrenti basti per chiudere
+BLE_EVALUATION_INTERVAL = 0.1     # secondi tra due valutazioni della tabella RSSI
+BLE_RSSI_MAX_AGE = 10.0           # secondi dopo i quali una lettura RSSI è considerata scaduta
+BLE_SINGLE_SCAN_TIMEOUT = 5.0     # durata massima di una scansione singola
+BLE_EARLY_EXIT_ADVERTISEMENTS = 3 # advertisement consecutive con lo stesso vincitore per chiudere la scansione singola
+BLE_RSSI_FILTER = 'kalman'        # filtro RSSI per beacon: none, ewma, kalman, median
+BLE_SWITCH_MARGIN_DB = 3.0        # isteresi: dB di vantaggio sull'area corrente per cambiare area
+BLE_DWELL_TIME = 2.0              # isteresi: secondi di vantaggio continuo prima di cambiare area
+BLE_TREND_WINDOW = 3.0            # secondi di storico RSSI usati per stimare la tendenza
+BLE_TREND_MIN_SAMPLES = 4         # campioni minimi nella finestra per stimare la tendenza
+BLE_TREND_MIN_SLOPE = 2.0         # dB/s di crescita per considerare un beacon "in avvicinamento"
+BLE_TREND_MAX_GAP_DB = 12.0       # distacco massimo dal beacon dell'area corrente per il suggerimento
+BLE_HINT_COOLDOWN = 30.0          # secondi prima di ripetere lo stesso suggerimento di area
+
+# Filtri per le letture RSSI di un singolo beacon: update() riceve un campione
+# grezzo e ritorna il valore filtrato.
+
+class RawRssiFilter:
+    """Nessun filtro: ritorna l'ultimo campione ricevuto."""
+
+    def update(self, rssi):
+        return rssi
+
+class EwmaRssiFilter:
+    """Media mobile esponenziale (EWMA)."""
+
+    def __init__(self, alpha=0.3):
+        self.alpha = alpha
+        self.value = None
+
+    def update(self, rssi):
+        if self.value is None:
+            self.value = float(rssi)
+        else:
+            self.value = self.alpha * rssi + (1 - self.alpha) * self.value
+        return self.value
+
+class KalmanRssiFilter:
+    """Filtro di Kalman 1-D con modello a stato costante."""
+
+    def __init__(self, process_noise=0.5, measurement_noise=4.0):
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.value = None
+        self.error = measurement_noise
+
+    def update(self, rssi):
+        if self.value is None:
+            self.value = float(rssi)
+            return self.value
+        self.error += self.process_noise
+        gain = self.error / (self.error + self.measurement_noise)
+        self.value += gain * (rssi - self.value)
+        self.error *= (1 - gain)
+        return self.value
+
+class MedianRssiFilter:
+    """Mediana degli ultimi N campioni."""
+
+    def __init__(self, window=5):
+        self.samples = collections.deque(maxlen=max(1, int(window)))
+
+    def update(self, rssi):
+        self.samples.append(rssi)
+        return statistics.median(self.samples)
+
+RSSI_FILTERS = {
+    'none': RawRssiFilter,
+    'ewma': EwmaRssiFilter,
+    'kalman': KalmanRssiFilter,
+    'median': MedianRssiFilter,
+}
+
+def create_rssi_filter_factory(kind=BLE_RSSI_FILTER, **params):
+    """Ritorna una factory che crea un filtro RSSI del tipo richiesto per ogni beacon."""
+    filter_class = RSSI_FILTERS.get(kind)
+    if filter_class is None:
+        logger.warning(f"Filtro RSSI sconosciuto '{kind}', uso 'none'")
+        return RawRssiFilter
+    return functools.partial(filter_class, **params)
+
+class BeaconRssiTable:
+    """Tabella RSSI per MAC aggiornata in tempo reale dalle advertisement BLE.
+    
+    Ogni beacon ha il proprio filtro (creato da filter_factory): la tabella
+    conserva il valore filtrato, non il singolo campione grezzo.
+    """
+
+    def __init__(self, ble_mapping, max_age=BLE_RSSI_MAX_AGE, filter_factory=None):
+        self.target_macs = {mac.upper(): area_id for mac, area_id in ble_mapping.items()}
+        self.max_age = max_age
+        self.filter_factory = filter_factory or RawRssiFilter
+        self._readings = {}  # mac -> (rssi filtrato, timestamp)
+        self._filters = {}   # mac -> filtro RSSI (vedi RSSI_FILTERS)
+        self._lock = threading.Lock()
+
+    def update(self, mac, rssi, timestamp=None):
+        """Registra una lettura RSSI. Ritorna True se il MAC è un beacon configurato."""
+        mac = mac.upper()
+        if mac not in self.target_macs:
+            return False
+        now = timestamp if timestamp is not None else time.monotonic()
+        with self._lock:
+            previous = self._readings.get(mac)
+            rssi_filter = self._filters.get(mac)
+            # Riparte da zero se il beacon non si sentiva da troppo tempo
+            if rssi_filter is None or (previous and now - previous[1] > self.max_age):
+                rssi_filter = self._filters[mac] = self.filter_factory()
+            self._readings[mac] = (rssi_filter.update(rssi), now)
+        return True
+
+    def rssi_for(self, mac):
+        """Ritorna l'RSSI filtrato di un beacon, o None se non è stato sentito di recente."""
+        with self._lock:
+            reading = self._readings.get(mac.upper()) if mac else None
+        if reading is None or time.monotonic() - reading[1] > self.max_age:
+            return None
+        return reading[0]
+
+    def ranking(self):
+        """Ritorna la lista [(mac, rssi)] delle letture valide, dalla più forte alla più debole."""
+        now = time.monotonic()
+        with self._lock:
+            fresh = [(mac, rssi) for mac, (rssi, ts) in self._readings.items()
+                     if now - ts <= self.max_age]
+        fresh.sort(key=lambda reading: reading[1], reverse=True)
+        return fresh
+
+    def strongest(self):
+        """Ritorna (mac, rssi) del beacon con segnale più forte, o (None, None)."""
+        ranking = self.ranking()
+        return ranking[0] if ranking else (None, None)
+
+    def dominant(self, margin_db=BLE_DOMINANCE_MARGIN_DB, allow_single=True):
+        """Ritorna (mac, rssi) del beacon che supera il secondo di almeno margin_db.
         
-        try:
-            devices = await BleakScanner.discover(timeout=5.0, return_adv=True)
-            
-            # Trova il dispositivo target con RSSI più alto (segnale più forte)
-            for device, adv_data in devices.values():
-                if device.address.upper() in target_macs:
-                    rssi = adv_data.rssi
-                    logger.info(f"Trovato {device.address.upper()} con RSSI: {rssi}")
-                    
-                    if rssi > strongest_rssi:
-                        strongest_rssi = rssi
-                        strongest_device = device
-            
-            if strongest_device:
-                found_mac = strongest_device.address.upper()
-                area_id = target_macs.get(found_mac)
-                
-                logger.info(f"Dispositivo più vicino: {found_mac} (RSSI: {strongest_rssi})")
-                safe_print(f"Dispositivo più vicino: {found_mac} (RSSI: {strongest_rssi})")
-                
-                if area_id:
-                    logger.info(f"Area rilevata: {area_id}")
-                    callback(area_id)
-                    if single_scan:
-                        return
+        Se è stato sentito un solo beacon viene considerato dominante solo con allow_single.
+        """
+        ranking = self.ranking()
+        if not ranking:
+            return None, None
+        if len(ranking) == 1:
+            return ranking[0] if allow_single else (None, None)
+        if ranking[0][1] - ranking[1][1] >= margin_db:
+            return ranking[0]
+        return None, None
+
+    def area_for(self, mac):
+        """Ritorna l'area_id associata a un MAC configurato."""
+        return self.target_macs.get(mac.upper()) if mac else None
+
+class BleEarlyExitPolicy:
+    """Politica di terminazione anticipata per la scansione BLE singola.
+    
+    La scansione può terminare quando:
+    - il beacon più forte supera il secondo di almeno margin_db per
+      required_advertisements advertisement consecutive, oppure
+    - tutti i beacon configurati in ble_mapping hanno già trasmesso.
+    
+    Un beacon sentito da solo vale come vincitore solo dopo single_beacon_min_time
+    secondi: prima potrebbe non aver ancora trasmesso un beacon più vicino.
+    """
+
+    def __init__(self, target_macs, margin_db=BLE_DOMINANCE_MARGIN_DB,
+                 required_advertisements=BLE_EARLY_EXIT_ADVERTISEMENTS,
+                 single_beacon_min_time=BLE_SINGLE_BEACON_MIN_TIME, started=None):
+        self.expected_macs = {mac.upper() for mac in target_macs}
+        self.margin_db = margin_db
+        self.required_advertisements = max(1, int(required_advertisements))
+        self.single_beacon_min_time = single_beacon_min_time
+        self.started = time.monotonic() if started is None else started
+        self._seen_macs = set()
+        self._leader = None
+        self._streak = 0
+
+    def observe(self, table, mac, timestamp=None):
+        """Valuta la tabella dopo un'advertisement di un beacon configurato.
+        
+        Ritorna True se la scansione può essere chiusa.
+        """
+        now = time.monotonic() if timestamp is None else timestamp
+        self._seen_macs.add(mac.upper())
+        if self.expected_macs and self.expected_macs <= self._seen_macs:
+            return True
+        
+        ranking = table.ranking()
+        if not ranking:
+            return False
+        
+        leader, leader_rssi = ranking[0]
+        if len(ranking) == 1:
+            confident = now - self.started >= self.single_beacon_min_time
+        else:
+            confident = leader_rssi - ranking[1][1] >= self.margin_db
+        if not confident:
+            self._leader = None
+            self._streak = 0
+        elif leader == self._leader:
+            self._streak += 1
+        else:
+            self._leader = leader
+            self._streak = 1
+        
+        return self._streak >= self.required_advertisements
+
+class AreaHysteresis:
+    """Isteresi e tempo di permanenza prima di cambiare l'area rilevata.
+    
+    Una nuova area sostituisce quella corrente solo se il suo beacon supera quello
+    dell'area corrente di almeno switch_margin_db, in modo continuativo per almeno
+    dwell_time secondi. Evita i continui ricaricamenti tra stanze adiacenti.
+    """
+
+    def __init__(self, switch_margin_db=BLE_SWITCH_MARGIN_DB, dwell_time=BLE_DWELL_TIME):
+        self.switch_margin_db = switch_margin_db
+        self.dwell_time = dwell_time
+        self.current_area = None
+        self._pending_area = None
+        self._pending_since = None
+
+    def _beats_current(self, table, candidate_mac):
+        """True se il candidato supera l'area corrente del margine di isteresi."""
+        current_readings = [rssi for mac, rssi in table.ranking()
+                            if table.area_for(mac) == self.current_area]
+        if not current_readings:
+            # L'area corrente non è più visibile
+            return True
+        return table.rssi_for(candidate_mac) - current_readings[0] >= self.switch_margin_db
+
+    def update(self, table, candidate_mac):
+        """Scansione continua: valuta il beacon candidato e ritorna l'area corrente."""
+        candidate_area = table.area_for(candidate_mac)
+        if candidate_area is None or candidate_area == self.current_area:
+            self._pending_area = None
+            return self.current_area
+        
+        if self.current_area is None:
+            self.current_area = candidate_area
+            return self.current_area
+        
+        if not self._beats_current(table, candidate_mac):
+            self._pending_area = None
+            return self.current_area
+        
+        now = time.monotonic()
+        if candidate_area != self._pending_area:
+            self._pending_area = candidate_area
+            self._pending_since = now
+        
+        if now - self._pending_since >= self.dwell_time:
+            logger.info(f"Cambio area per isteresi: {self.current_area} -> {candidate_area}")
+            self.current_area = candidate_area
+            self._pending_area = None
+        return self.current_area
+
+    def decide(self, table, candidate_mac):
+        """Scansione singola: applica solo il margine di isteresi rispetto all'ultima area."""
+        candidate_area = table.area_for(candidate_mac)
+        if candidate_area is None:
+            return None
+        if self.current_area is None or candidate_area == self.current_area or self._beats_current(table, candidate_mac):
+            self.current_area = candidate_area
+        self._pending_area = None
+        return self.current_area
+
+class RssiTrendTracker:
+    """Tendenza dell'RSSI filtrato di ogni beacon nella finestra recente.
+    
+    La pendenza (dB/s) è stimata con i minimi quadrati sugli ultimi window secondi.
+    likely_next_area() indica l'area di un beacon non dominante il cui segnale
+    cresce: è la stanza in cui l'utente sta probabilmente entrando.
+    """
+
+    def __init__(self, window=BLE_TREND_WINDOW, min_slope=BLE_TREND_MIN_SLOPE,
+                 max_gap_db=BLE_TREND_MAX_GAP_DB, min_samples=BLE_TREND_MIN_SAMPLES):
+        self.window = window
+        self.min_slope = min_slope
+        self.max_gap_db = max_gap_db
+        self.min_samples = min_samples
+        self._samples = {}  # mac -> deque[(timestamp, rssi)]
+        self._lock = threading.Lock()
+
+    def add(self, mac, rssi, timestamp=None):
+        if rssi is None:
+            return
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        with self._lock:
+            samples = self._samples.setdefault(mac.upper(), collections.deque())
+            samples.append((timestamp, rssi))
+            while samples and timestamp - samples[0][0] > self.window:
+                samples.popleft()
+
+    def slope(self, mac):
+        """Pendenza in dB/s, o None se i campioni non bastano."""
+        with self._lock:
+            samples = list(self._samples.get(mac.upper(), ()))
+        if len(samples) < self.min_samples:
+            return None
+        mean_t = sum(t for t, _ in samples) / len(samples)
+        mean_r = sum(r for _, r in samples) / len(samples)
+        variance = sum((t - mean_t) ** 2 for t, _ in samples)
+        if variance == 0:
+            return None
+        return sum((t - mean_t) * (r - mean_r) for t, r in samples) / variance
+
+    def likely_next_area(self, table, current_area):
+        """Ritorna l'area di un beacon secondario in crescita, o None."""
+        ranking = table.ranking()
+        current_readings = [rssi for mac, rssi in ranking if table.area_for(mac) == current_area]
+        if not current_readings:
+            return None
+        for mac, rssi in ranking:
+            area_id = table.area_for(mac)
+            if area_id is None or area_id == current_area:
+                continue
+            if current_readings[0] - rssi > self.max_gap_db:
+                # Beacon ordinati per RSSI: i successivi sono ancora più lontani
+                return None
+            slope = self.slope(mac)
+            if slope is not None and slope >= self.min_slope:
+                return area_id
+        return None
+
+BLE_PRESENCE_IDLE_TIMEOUT = 60.0  # secondi di scansione dopo l'ultima richiesta
+BLE_PRESENCE_MAX_AGE = 10.0       # età massima di una stima area per essere riusata
+BLE_PRESENCE_RETRY_DELAY = 2.0    # attesa prima di riaprire lo scanner dopo un errore
+BLE_PRESENCE_MAX_RETRY_DELAY = 30.0  # attesa massima tra due tentativi dopo errori consecutivi
+
+class BlePresenceService:
+    """Servizio di presenza BLE condiviso, unico proprietario dell'adattatore.
+    
+    Esegue una sola scansione continua (filtri RSSI, early exit e isteresi) e
+    mantiene la tabella RSSI e la stima dell'area corrente. La finestra principale
+    e il controllo vocale chiedono l'area al servizio invece di avviare scansioni
+    proprie: se la stima è recente la risposta è immediata.
+    
+    La scansione resta attiva finché ci sono iscritti continui o per idle_timeout
+    secondi dall'ultima richiesta, poi l'adattatore viene rilasciato.
+    """
+
+    def __init__(self, ble_mapping, ble_config=None, idle_timeout=BLE_PRESENCE_IDLE_TIMEOUT):
+        self.ble_config = ble_config or {}
+        self.margin_db = self.ble_config.get('dominance_margin_db', BLE_DOMINANCE_MARGIN_DB)
+        self.early_exit_advertisements = self.ble_config.get('early_exit_advertisements', BLE_EARLY_EXIT_ADVERTISEMENTS)
+        self.scan_timeout = self.ble_config.get('single_scan_timeout', BLE_SINGLE_SCAN_TIMEOUT)
+        filter_factory = create_rssi_filter_factory(
+            self.ble_config.get('rssi_filter', BLE_RSSI_FILTER),
+            **self.ble_config.get('rssi_filter_params', {})
+        )
+        self.table = BeaconRssiTable(ble_mapping, filter_factory=filter_factory)
+        self.hysteresis = AreaHysteresis(
+            self.ble_config.get('switch_margin_db', BLE_SWITCH_MARGIN_DB),
+            self.ble_config.get('dwell_time', BLE_DWELL_TIME)
+        )
+        self.trend = RssiTrendTracker()
+        self.idle_timeout = idle_timeout
+        self.current_area = None
+        self.area_updated_at = None
+        self._subscribers = []
+        self._hint_subscribers = []
+        self._hints_sent = {}  # area_id -> istante dell'ultimo suggerimento
+        self._waiters = []  # [(callback, deadline)] richieste singole in attesa
+        self._lock = threading.RLock()
+        self._area_condition = threading.Condition(self._lock)
+        self._last_demand = 0.0
+        self._future = None
+        self._stop_event = threading.Event()
+
+    def update_mapping(self, ble_mapping):
+        """Aggiorna i beacon configurati (es. dopo una modifica a ble_entity.json)."""
+        with self._lock:
+            self.table.target_macs = {mac.upper(): area_id for mac, area_id in ble_mapping.items()}
+
+    def subscribe(self, callback, notify_current=True):
+        """Iscrive una callback ad ogni cambio di area; la scansione resta attiva finché è iscritta.
+        
+        Con notify_current la callback riceve subito l'area corrente, se recente.
+        """
+        with self._lock:
+            if callback not in self._subscribers:
+                self._subscribers.append(callback)
+        self._ensure_running()
+        area = self.current_estimate() if notify_current else None
+        if area:
+            callback(area)
+
+    def unsubscribe(self, callback):
+        """Rimuove una callback iscritta con subscribe()."""
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def subscribe_hints(self, callback):
+        """Iscrive callback(area_id) ai suggerimenti di "probabile prossima area".
+        
+        Non tiene attiva la scansione: i suggerimenti arrivano solo mentre è in corso.
+        """
+        with self._lock:
+            if callback not in self._hint_subscribers:
+                self._hint_subscribers.append(callback)
+
+    def unsubscribe_hints(self, callback):
+        """Rimuove una callback iscritta con subscribe_hints()."""
+        with self._lock:
+            if callback in self._hint_subscribers:
+                self._hint_subscribers.remove(callback)
+
+    def current_estimate(self, max_age=BLE_PRESENCE_MAX_AGE):
+        """Ritorna l'area stimata se confermata negli ultimi max_age secondi, altrimenti None."""
+        with self._lock:
+            if self.current_area and self.area_updated_at is not None:
+                if time.monotonic() - self.area_updated_at <= max_age:
+                    return self.current_area
+        return None
+
+    def request_area(self, callback, timeout=None):
+        """Richiesta singola: chiama callback(area_id) appena l'area è nota.
+        
+        Allo scadere di timeout riceve best_guess(), None se nessun beacon è visibile.
+        """
+        area = self.current_estimate()
+        self._ensure_running()
+        if area:
+            callback(area)
+            return
+        with self._lock:
+            self._waiters.append((callback, time.monotonic() + (timeout or self.scan_timeout)))
+
+    def best_guess(self):
+        """Area del beacon più forte visibile ora, anche senza un margine sul secondo."""
+        mac, _ = self.table.strongest()
+        return self.table.area_for(mac) if mac else None
+
+    def wait_for_area(self, timeout=None):
+        """Versione bloccante di request_area(), per i thread fuori dal loop Qt.
+        
+        Se la prima stima non arriva entro timeout ritorna best_guess().
+        """
+        self._ensure_running()
+        deadline = time.monotonic() + (timeout or self.scan_timeout)
+        with self._area_condition:
+            while True:
+                area = self.current_estimate()
+                if area:
+                    return area
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return self.best_guess()
+                self._area_condition.wait(remaining)
+
+    def stop(self):
+        """Ferma la scansione e rilascia l'adattatore."""
+        self._stop_event.set()
+        future = self._future
+        if future:
+            try:
+                future.result(timeout=2)
+            except Exception:
+                pass
+
+    def _ensure_running(self):
+        with self._lock:
+            self._last_demand = time.monotonic()
+            self._stop_event.clear()
+            if self._future is None:
+                self._future = get_async_runtime().submit(self._run())
+
+    def _is_idle(self):
+        with self._lock:
+            return not self._subscribers and not self._waiters and \
+                time.monotonic() - self._last_demand >= self.idle_timeout
+
+    async def _run(self):
+        retry_delay = BLE_PRESENCE_RETRY_DELAY
+        while True:
+            try:
+                await self._scan_session()
+                retry_delay = BLE_PRESENCE_RETRY_DELAY
+            except Exception as e:
+                logger.error(f"Errore durante la scansione BLE: {e} (nuovo tentativo tra {retry_delay:.0f}s)")
+                safe_print(f"Errore scansione BLE: {e}")
+                self._fail_waiters()
+                await asyncio.sleep(retry_delay)
+                # Adattatore assente o occupato: riprova sempre più di rado
+                retry_delay = min(retry_delay * 2, BLE_PRESENCE_MAX_RETRY_DELAY)
+            with self._lock:
+                if self._stop_event.is_set() or self._is_idle():
+                    self._future = None
+                    logger.info("Servizio presenza BLE inattivo, scanner rilasciato")
+                    return
+
+    async def _scan_session(self):
+        """Una sessione di scansione continua, finché c'è richiesta."""
+        early_exit = BleEarlyExitPolicy(self.table.target_macs, self.margin_db, self.early_exit_advertisements)
+        resolved = asyncio.Event()
+        session = {'resolved_area': False}
+        
+        def on_advertisement(device, adv_data):
+            if self.table.update(device.address, adv_data.rssi):
+                self.trend.add(device.address, self.table.rssi_for(device.address))
+                if not resolved.is_set() and early_exit.observe(self.table, device.address):
+                    resolved.set()
+        
+        logger.info("Avvio servizio presenza BLE...")
+        safe_print("Scansione BLE in corso...")
+        started = time.monotonic()
+        
+        async with BleakScanner(detection_callback=on_advertisement):
+            while not self._stop_event.is_set() and not self._is_idle():
+                if resolved.is_set():
+                    await asyncio.sleep(BLE_EVALUATION_INTERVAL)
                 else:
-                    logger.warning(f"MAC trovato ma area_id mancante: {found_mac}")
-            else:
-                logger.info("Nessun dispositivo BLE target rilevato")
-                safe_print("Nessun dispositivo nelle vicinanze")
-                # Se è una scansione singola e non trova dispositivi, notifica comunque
-                if single_scan:
-                    callback(None)
-                
-        except Exception as e:
-            logger.error(f"Errore durante la scansione BLE: {e}")
-            safe_print(f"Errore scansione BLE: {e}")
-            # Notifica errore in caso di scansione singola
-            if single_scan:
-                callback(None)
+                    try:
+                        await asyncio.wait_for(resolved.wait(), timeout=BLE_EVALUATION_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                self._evaluate(session, resolved.is_set(), time.monotonic() - started)
+                self._expire_waiters()
+
+    def _evaluate(self, session, resolved, elapsed):
+        if not session['resolved_area']:
+            # Prima stima della sessione: stessa politica di early exit della scansione singola
+            if not resolved and elapsed < self.scan_timeout:
+                return
+            mac, rssi = self.table.strongest()
+            area_id = self.hysteresis.decide(self.table, mac) if mac else None
+        else:
+            mac, rssi = self.table.dominant(self.margin_db, allow_single=elapsed >= BLE_SETTLE_TIME)
+            area_id = self.hysteresis.update(self.table, mac)
         
-        if single_scan or stop_event.is_set():
+        if not area_id:
             return
-            
-        await asyncio.sleep(5)
+        # La stima è "fresca" solo se un beacon dell'area è ancora visibile
+        if not any(self.table.area_for(visible_mac) == area_id for visible_mac, _ in self.table.ranking()):
+            return
+        if not session['resolved_area']:
+            session['resolved_area'] = True
+            logger.info(f"Dispositivo più vicino: {mac} (RSSI: {rssi:.0f}) dopo {elapsed:.2f}s")
+            safe_print(f"Dispositivo più vicino: {mac} (RSSI: {rssi:.0f})")
+        self._publish(area_id)
+        self._publish_hint(self.trend.likely_next_area(self.table, area_id))
+
+    def _publish_hint(self, area_id):
+        if not area_id:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._hints_sent.get(area_id, float('-inf')) < BLE_HINT_COOLDOWN:
+                return
+            self._hints_sent[area_id] = now
+            subscribers = list(self._hint_subscribers)
+        logger.info(f"Probabile prossima area: {area_id}")
+        for callback in subscribers:
+            callback(area_id)
+
+    def _publish(self, area_id):
+        with self._lock:
+            changed = area_id != self.current_area
+            self.current_area = area_id
+            self.area_updated_at = time.monotonic()
+            waiters, self._waiters = self._waiters, []
+            # Una callback in attesa e anche iscritta riceve l'area una sola volta
+            served = [callback for callback, _ in waiters]
+            subscribers = [callback for callback in self._subscribers if callback not in served] if changed else []
+            self._area_condition.notify_all()
+        if changed:
+            logger.info(f"Area rilevata: {area_id}")
+        for callback, _ in waiters:
+            callback(area_id)
+        for callback in subscribers:
+            callback(area_id)
+
+    def _expire_waiters(self):
+        now = time.monotonic()
+        with self._lock:
+            expired = [callback for callback, deadline in self._waiters if deadline <= now]
+            self._waiters = [(callback, deadline) for callback, deadline in self._waiters if deadline > now]
+        if not expired:
+            return
+        # Nessun beacon dominante entro la scadenza: vale comunque il più forte
+        area_id = self.best_guess()
+        if area_id is None:
+            logger.info("Nessun dispositivo BLE target rilevato")
+            safe_print("Nessun dispositivo nelle vicinanze")
+        for callback in expired:
+            callback(area_id)
+
+    def _fail_waiters(self):
+        with self._lock:
+            waiters, self._waiters = self._waiters, []
+        for callback, _ in waiters:
+            callback(None)
 
-def run_ble_scanner(ble_mapping, callback, stop_event, single_scan=False):
-    """Wrapper per eseguire il task asincrono BLE in un thread separato."""
-    asyncio.run(ble_scanner_task(ble_mapping, callback, stop_event, single_scan))
+_ble_presence_service = None
+_ble_presence_lock = threading.Lock()
+
+def get_ble_presence_service(ble_mapping, ble_config=None):
+    """Ritorna il servizio di presenza BLE condiviso dal processo, creandolo al primo utilizzo."""
+    global _ble_presence_service
+    with _ble_presence_lock:
+        if _ble_presence_service is None:
+            _ble_presence_service = BlePresenceService(ble_mapping, ble_config)
+        else:
+            _ble_presence_service.update_mapping(ble_mapping)
+        return _ble_presence_service
 
 def get_stato_entita(entity_id, max_retries=3):
     """Gets the state of a single entity from Home Assistant with retry logic."""
-    url = f"{HOME_ASSISTANT_URL}/api/states/{entity_id}"
+    client = get_ha_client()
     
     for attempt in range(max_retries):
         try:
-            response = requests.get(url, headers=HEADERS, timeout=5)
+            response = client.get(f"/api/states/{entity_id}")
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -1271,14 +2786,43 @@ def get_stato_entita(entity_id, max_retries=3):
     
     return None
 
+def get_stati_entita(entity_ids, max_retries=3):
+    """Gets the states of several entities with a single /api/states request.
+    
+    Returns a dict entity_id -> state data (same format as get_stato_entita);
+    entities not found are omitted. Returns None if Home Assistant is unreachable.
+    """
+    wanted = set(entity_ids)
+    if not wanted:
+        return {}
+    client = get_ha_client()
+    
+    for attempt in range(max_retries):
+        try:
+            response = client.get('/api/states', timeout=10)
+            response.raise_for_status()
+            return {
+                state_data['entity_id']: state_data
+                for state_data in response.json()
+                if state_data.get('entity_id') in wanted
+            }
+        except requests.exceptions.RequestException as e:
+            if attempt == max_retries - 1:
+                logger.error(f"Error connecting to Home Assistant after {max_retries} attempts: {e}")
+                safe_print(f"Errore durante la connessione ad Home Assistant: {e}")
+                return None
+            # Backoff esponenziale: 0.5s, 1s, 1.5s
+            time.sleep(0.5 * (attempt + 1))
+    
+    return None
+
 def toggle_entita(entity_id):
     """Toggles the state of a single entity."""
     domain = entity_id.split('.')[0]
     service = 'toggle'
-    url = f"{HOME_ASSISTANT_URL}/api/services/{domain}/{service}"
     payload = {"entity_id": entity_id}
     try:
-        response = requests.post(url, headers=HEADERS, json=payload, timeout=5)
+        response = get_ha_client().post(f"/api/services/{domain}/{service}", json=payload)
         response.raise_for_status()
         return True
     except requests.exceptions.RequestException as e:
@@ -1288,10 +2832,9 @@ def toggle_entita(entity_id):
 
 def set_cover_position(entity_id, position):
     """Sets the position of a cover entity."""
-    url = f"{HOME_ASSISTANT_URL}/api/services/cover/set_cover_position"
     payload = {"entity_id": entity_id, "position": position}
     try:
-        response = requests.post(url, headers=HEADERS, json=payload, timeout=5)
+        response = get_ha_client().post('/api/services/cover/set_cover_position', json=payload)
         response.raise_for_status()
         return True
     except requests.exceptions.RequestException as e:
@@ -1299,54 +2842,485 @@ def set_cover_position(entity_id, position):
         safe_print(f"Errore durante l'impostazione della posizione per '{entity_id}': {e}")
         return False
 
+HA_WS_RECONNECT_DELAY = 5.0  # secondi prima di ritentare la connessione WebSocket
+
+def _ha_timestamp_to_iso(timestamp):
+    """Converte un timestamp UNIX della WebSocket API nel formato ISO di /api/states."""
+    if timestamp is None:
+        return 'N/A'
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+
+class HAWebSocketClient:
+    """Client per la WebSocket API di Home Assistant.
+    
+    Si autentica una sola volta e mantiene una sottoscrizione subscribe_entities
+    limitata alle entità visibili. Ogni cambio di stato viene inoltrato a
+    on_state(entity_id, state_data) nello stesso formato di /api/states;
+    gli eventi in event_types vengono inoltrati a on_event(event_type, data).
+    Gira sul loop persistente; se la connessione cade viene ritentata in background.
+    """
+
+    def __init__(self, url, token, on_state, on_event=None, event_types=()):
+        self.url = url
+        self.ws_url = url.replace('https://', 'wss://', 1).replace('http://', 'ws://', 1).rstrip('/') + '/api/websocket'
+        self.token = token
+        self.on_state = on_state
+        self.on_event = on_event
+        self.event_types = tuple(event_types)
+        self._event_subscriptions = {}  # id sottoscrizione -> event_type
+        self.entity_ids = frozenset()
+        self.connected = False
+        self.subscribed = False  # True quando Home Assistant ha confermato subscribe_entities
+        self._states = {}  # entity_id -> stato compresso, per applicare i diff
+        self._ws = None
+        self._message_id = 0
+        self._subscription_id = None
+        self._future = None
+        self._closing = False
+
+    def start(self):
+        """Avvia la connessione sul loop persistente."""
+        if self._future is None:
+            self._future = get_async_runtime().submit(self._run())
+
+    def stop(self):
+        """Chiude la connessione e interrompe i tentativi di riconnessione."""
+        self._closing = True
+        if self._future:
+            self._future.cancel()
+            self._future = None
+
+    def set_entities(self, entity_ids):
+        """Aggiorna le entità sottoscritte (thread-safe)."""
+        entity_ids = frozenset(entity_ids)
+        get_async_runtime().call_soon(self._on_entities_changed, entity_ids)
+
+    def _on_entities_changed(self, entity_ids):
+        if entity_ids == self.entity_ids:
+            return
+        self.entity_ids = entity_ids
+        if self._ws is not None:
+            asyncio.ensure_future(self._subscribe())
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                async with websockets.connect(self.ws_url, max_size=None, ping_interval=30) as ws:
+                    await self._authenticate(ws)
+                    self._ws = ws
+                    self.connected = True
+                    logger.info(f"WebSocket Home Assistant connesso: {self.ws_url}")
+                    await self._subscribe()
+                    for event_type in self.event_types:
+                        subscription_id = await self._send({'type': 'subscribe_events', 'event_type': event_type})
+                        self._event_subscriptions[subscription_id] = event_type
+                    async for raw_message in ws:
+                        self._handle_message(json.loads(raw_message))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"WebSocket Home Assistant non disponibile ({self.ws_url}): {e}")
+            finally:
+                self._ws = None
+                self._subscription_id = None
+                self._event_subscriptions.clear()
+                self.connected = False
+                self.subscribed = False
+            if not self._closing:
+                await asyncio.sleep(HA_WS_RECONNECT_DELAY)
+
+    async def _authenticate(self, ws):
+        message = json.loads(await ws.recv())
+        if message.get('type') != 'auth_required':
+            raise ConnectionError(f"Risposta inattesa: {message.get('type')}")
+        await ws.send(json.dumps({'type': 'auth', 'access_token': self.token}))
+        message = json.loads(await ws.recv())
+        if message.get('type') != 'auth_ok':
+            raise PermissionError(message.get('message', 'autenticazione fallita'))
+
+    async def _send(self, payload):
+        self._message_id += 1
+        payload = dict(payload, id=self._message_id)
+        await self._ws.send(json.dumps(payload))
+        return self._message_id
+
+    async def _subscribe(self):
+        """(Ri)crea la sottoscrizione subscribe_entities per le entità visibili."""
+        if self._ws is None:
+            return
+        if self._subscription_id is not None:
+            await self._send({'type': 'unsubscribe_events', 'subscription': self._subscription_id})
+            self._subscription_id = None
+        self.subscribed = False
+        self._states.clear()
+        if self.entity_ids:
+            self._subscription_id = await self._send({
+                'type': 'subscribe_entities',
+                'entity_ids': sorted(self.entity_ids),
+            })
+
+    def _handle_message(self, message):
+        message_type = message.get('type')
+        if message_type == 'event' and message.get('id') == self._subscription_id:
+            self._handle_entities_event(message.get('event', {}))
+        elif message_type == 'event' and message.get('id') in self._event_subscriptions:
+            event = message.get('event', {})
+            if self.on_event:
+                self.on_event(event.get('event_type'), event.get('data', {}))
+        elif message_type == 'result' and message.get('success', True):
+            if message.get('id') == self._subscription_id:
+                self.subscribed = True
+        elif message_type == 'result':
+            logger.warning(f"Errore WebSocket Home Assistant: {message.get('error')}")
+
+    def _handle_entities_event(self, event):
+        # "a": stati completi (prima notifica), "c": diff, "r": entità rimosse
+        for entity_id, compressed in event.get('a', {}).items():
+            self._states[entity_id] = dict(compressed)
+            self._emit(entity_id)
+        
+        for entity_id, diff in event.get('c', {}).items():
+            state = self._states.get(entity_id)
+            if state is None:
+                continue
+            additions = diff.get('+', {})
+            for key, value in additions.items():
+                if key == 'a':
+                    state['a'] = dict(state.get('a', {}), **value)
+                else:
+                    state[key] = value
+            if 'lc' in additions and 'lu' not in additions:
+                # "lu" viene omesso quando coincide con "lc"
+                state.pop('lu', None)
+            for attribute in diff.get('-', {}).get('a', []):
+                state.get('a', {}).pop(attribute, None)
+            self._emit(entity_id)
+        
+        for entity_id in event.get('r', []):
+            self._states.pop(entity_id, None)
+
+    def _emit(self, entity_id):
+        compressed = self._states[entity_id]
+        last_changed = compressed.get('lc')
+        state_data = {
+            'entity_id': entity_id,
+            'state': compressed.get('s'),
+            'attributes': dict(compressed.get('a', {})),
+            'last_changed': _ha_timestamp_to_iso(last_changed),
+            'last_updated': _ha_timestamp_to_iso(compressed.get('lu', last_changed)),
+        }
+        try:
+            self.on_state(entity_id, state_data)
+        except Exception as e:
+            logger.error(f"Errore aggiornamento stato da WebSocket per '{entity_id}': {e}")
+
 CACHE_DIR = 'icon_cache'
+ICON_PACK_FILE = 'icon_pack.json'
+ICON_ON_COLOR = '#FFD700'  # Giallo oro per dispositivi accesi
+ICON_CACHE_MAX_BYTES = 8 * 1024 * 1024  # budget di memoria dei pixmap delle icone (8 MB)
+LOADING_FRAME_COUNT = 24       # fotogrammi della rotazione completa (15° ciascuno)
+LOADING_FRAME_INTERVAL = 50    # millisecondi tra due fotogrammi
+
+def icon_variant(domain, state_data):
+    """Ritorna (icon_name, color) per lo stato di un'entità; color è None per le icone spente."""
+    state = state_data.get('state', 'unknown')
+    if domain == 'cover':
+        position = state_data.get('attributes', {}).get('current_position', 0)
+        if position < 36:
+            icon_name = ICONS_MAP['cover'].get(0, 'window-shutter')
+        else:
+            icon_name = ICONS_MAP['cover'].get('open', 'window-shutter-open')
+    else:
+        icon_name = ICONS_MAP.get(domain, {}).get(state, 'alert-circle')
+
+    # Determina il colore per le icone accese
+    color = None
+    if state == 'on' and domain in ['light', 'switch', 'fan']:
+        color = ICON_ON_COLOR
+    return icon_name, color
+
+def icon_pack_states():
+    """Stati rappresentativi che coprono ogni icona di ICONS_MAP, più l'icona di errore per dominio."""
+    for domain, icons in ICONS_MAP.items():
+        for key in icons:
+            if domain == 'cover':
+                # Per le tapparelle l'icona dipende dalla posizione
+                yield domain, {'state': 'open', 'attributes': {'current_position': 0 if key == 0 else 100}}
+            else:
+                yield domain, {'state': key}
+        if domain != 'system':
+            yield domain, {'state': 'unavailable'}
+
+def load_icon_pack(file_path=ICON_PACK_FILE):
+    """Carica il pacchetto icone ({icon_name: {colore: svg}}) accanto all'eseguibile o nel bundle."""
+    search_paths = [get_base_path(), getattr(sys, '_MEIPASS', None)]
+    for base_path in filter(None, search_paths):
+        full_path = os.path.join(base_path, file_path)
+        if os.path.exists(full_path):
+            try:
+                with open(full_path, 'r', encoding='utf-8') as file:
+                    return json.load(file).get('icons', {})
+            except (OSError, ValueError) as e:
+                logger.error(f"Error loading icon pack '{full_path}': {e}")
+    return None
+
+def build_icon_pack(file_path=ICON_PACK_FILE):
+    """Crea il pacchetto icone con tutte le icone di ICONS_MAP, già colorate.
+    
+    Da eseguire in fase di build (--build-icon-pack): a runtime le icone
+    vengono caricate da questo file, senza download.
+    """
+    variants = {}
+    for domain, state_data in icon_pack_states():
+        icon_name, color = icon_variant(domain, state_data)
+        variants.setdefault(icon_name, set()).add(color or '')
+    
+    icons = {}
+    for icon_name, colors in sorted(variants.items()):
+        cached_path = os.path.join(CACHE_DIR, f"{icon_name}.svg")
+        try:
+            if os.path.exists(cached_path):
+                with open(cached_path, 'rb') as f:
+                    svg_data = f.read()
+            else:
+                response = requests.get(f"{ICONS_BASE_URL}/{icon_name}.svg", timeout=10)
+                response.raise_for_status()
+                svg_data = response.content
+        except (OSError, requests.exceptions.RequestException) as e:
+            safe_print(f"✗ Impossibile recuperare l'icona '{icon_name}': {e}")
+            return False
+        icons[icon_name] = {
+            color: (ImageProvider._colorize_svg(svg_data, color) if color else svg_data).decode('utf-8')
+            for color in sorted(colors)
+        }
+        safe_print(f"  ✓ {icon_name} ({len(colors)} varianti)")
+    
+    full_path = os.path.join(get_base_path(), file_path)
+    with open(full_path, 'w', encoding='utf-8') as file:
+        json.dump({'version': 1, 'icons': icons}, file, separators=(',', ':'))
+    safe_print(f"✓ Pacchetto icone creato: {full_path} ({len(icons)} icone)")
+    return True
+
+class LoadingAnimator(QObject):
+    """Anima l'icona di caricamento di tutti i widget con un solo QTimer.
+    
+    I fotogrammi ruotati vengono calcolati una sola volta per dimensione
+    dell'icona; ad ogni tick ogni widget in caricamento riceve lo stesso fotogramma.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._frames = {}   # (larghezza, altezza, dpr) -> [QPixmap]
+        self._widgets = {}  # widget -> chiave dei fotogrammi
+        self._frame_index = 0
+        self._timer = QTimer(self)
+        self._timer.setInterval(LOADING_FRAME_INTERVAL)
+        self._timer.timeout.connect(self._tick)
+
+    def frames_for(self, pixmap):
+        """Ritorna i fotogrammi pre-renderizzati per la dimensione di pixmap."""
+        dpr = pixmap.devicePixelRatio()
+        key = (pixmap.width(), pixmap.height(), dpr)
+        if key not in self._frames:
+            step = 360 // LOADING_FRAME_COUNT
+            frames = []
+            for i in range(LOADING_FRAME_COUNT):
+                # Rotazione antioraria, come l'animazione originale
+                frame = pixmap.transformed(QTransform().rotate(-step * i), Qt.TransformationMode.SmoothTransformation)
+                frame.setDevicePixelRatio(dpr)
+                frames.append(frame)
+            self._frames[key] = frames
+        return key
+
+    def add(self, widget, pixmap):
+        self._widgets[widget] = self.frames_for(pixmap)
+        if not self._timer.isActive():
+            self._frame_index = 0
+            self._timer.start()
+
+    def remove(self, widget):
+        self._widgets.pop(widget, None)
+        if not self._widgets:
+            self._timer.stop()
+
+    def _tick(self):
+        self._frame_index = (self._frame_index + 1) % LOADING_FRAME_COUNT
+        for widget, key in list(self._widgets.items()):
+            widget.set_loading_frame(self._frames[key][self._frame_index])
+
+class PixmapCache:
+    """Cache LRU dei pixmap con un budget in byte.
+    
+    Le chiavi sono (icon_name, color, size, dpr): varianti colorate e
+    schermi HiDPI hanno ciascuno il proprio pixmap. Superato il budget
+    vengono scartati i pixmap usati meno di recente.
+    """
+
+    def __init__(self, max_bytes=ICON_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = collections.OrderedDict()  # key -> (pixmap, byte)
+        self._lock = threading.Lock()  # i download inseriscono da thread secondari
+
+    @staticmethod
+    def _pixmap_bytes(pixmap):
+        return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, pixmap):
+        size = self._pixmap_bytes(pixmap)
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old:
+                self.total_bytes -= old[1]
+            self._items[key] = (pixmap, size)
+            self.total_bytes += size
+            # Scarta i meno recenti, ma tieni sempre l'ultimo inserito
+            while self.total_bytes > self.max_bytes and len(self._items) > 1:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self.total_bytes -= evicted_size
+                self.evictions += 1
+
+    def stats(self):
+        """Ritorna un dizionario con le statistiche della cache."""
+        with self._lock:
+            return {
+                'entries': len(self._items),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
 class ImageProvider(QObject):
-    """Handles downloading, caching, and providing images as QPixmaps."""
-    image_ready = Signal(str, QPixmap)
+    """Handles downloading, caching, and providing images as QPixmaps.
+    
+    Pixmaps not yet available are delivered only to the callbacks subscribed
+    to their cache_key (one-shot), not broadcast to every widget.
+    """
+    image_ready = Signal(object, QPixmap)
 
     def __init__(self):
         super().__init__()
-        self._cache = {}
+        self._cache = PixmapCache()
+        self._subscribers = {}  # cache_key -> [callback(cache_key, pixmap)]
+        self._pending = set()   # cache_key in caricamento
+        self.loading_animator = LoadingAnimator(self)
+        # Il signal porta i pixmap scaricati nel thread della GUI
+        self.image_ready.connect(self._dispatch)
         if not os.path.exists(CACHE_DIR):
             os.makedirs(CACHE_DIR)
+        self._icon_pack = load_icon_pack()
+        self._load_icon_atlas()
 
-    def get_pixmap(self, domain, state_data):
-        """Requests a pixmap. Returns from cache or starts a download thread."""
-        if not state_data:
-            return None
-            
-        state = state_data.get('state', 'unknown')
-        icon_name = 'alert-circle'
+    def _load_icon_atlas(self):
+        """Pre-renderizza tutte le icone del pacchetto alla dimensione ICON_SIZE."""
+        if not self._icon_pack:
+            logger.info("Pacchetto icone non trovato: uso cache su disco e download")
+            return
+        dpr = self.screen_dpr()
+        for domain, state_data in icon_pack_states():
+            cache_key, icon_name, color = self._resolve_icon(domain, state_data, dpr)
+            svg = self._icon_pack.get(icon_name, {}).get(color or '')
+            if svg and cache_key not in self._cache:
+                self._cache.put(cache_key, self._render_svg(svg.encode('utf-8'), dpr))
+        logger.info(f"Atlante icone caricato: {len(self._cache)} icone")
 
-        if domain == 'cover':
-            position = state_data.get('attributes', {}).get('current_position', 0)
-            if position < 36:
-                icon_name = ICONS_MAP['cover'].get(0, 'window-shutter')
-            else:
-                icon_name = ICONS_MAP['cover'].get('open', 'window-shutter-open')
-        else:
-            icon_name = ICONS_MAP.get(domain, {}).get(state, 'alert-circle')
+    @staticmethod
+    def screen_dpr():
+        """Device pixel ratio dello schermo principale (1.0 senza schermo)."""
+        app = QApplication.instance()
+        screen = app.primaryScreen() if app else None
+        return screen.devicePixelRatio() if screen else 1.0
+
+    def cache_stats(self):
+        return self._cache.stats()
 
-        # Usa sempre icon_name come parte della cache_key per coerenza
-        cache_key = f"{domain}_{icon_name}"
-        if icon_name == 'loading':
-            cache_key = 'loading_icon'
+    def subscribe(self, cache_key, callback):
+        """Chiama callback(cache_key, pixmap) quando il pixmap di cache_key è pronto."""
+        callbacks = self._subscribers.setdefault(cache_key, [])
+        if callback not in callbacks:
+            callbacks.append(callback)
 
-        if cache_key in self._cache:
-            return self._cache[cache_key]
+    def unsubscribe(self, callback):
+        """Rimuove callback da tutte le attese."""
+        for cache_key in list(self._subscribers):
+            callbacks = self._subscribers[cache_key]
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                del self._subscribers[cache_key]
 
-        # Determina il colore per le icone accese
-        color = None
-        if state == 'on' and domain in ['light', 'switch', 'fan']:
-            color = '#FFD700'  # Giallo oro per dispositivi accesi
+    def _dispatch(self, cache_key, pixmap):
+        self._pending.discard(cache_key)
+        for callback in self._subscribers.pop(cache_key, []):
+            callback(cache_key, pixmap)
+
+    def cache_key_for(self, domain, state_data, dpr=1.0):
+        """Ritorna la cache_key dell'icona per uno stato."""
+        return self._resolve_icon(domain, state_data, dpr)[0]
+
+    @staticmethod
+    def _resolve_icon(domain, state_data, dpr=1.0):
+        """Ritorna (cache_key, icon_name, color) per uno stato.
+        
+        cache_key è (icon_name, color, size, dpr).
+        """
+        icon_name, color = icon_variant(domain, state_data)
+        return (icon_name, color, ICON_SIZE, dpr), icon_name, color
+
+    def get_pixmap(self, domain, state_data, callback=None, dpr=1.0):
+        """Requests a pixmap. Returns it from cache, or None and calls callback when ready."""
+        if not state_data:
+            return None
+        
+        cache_key, icon_name, color = self._resolve_icon(domain, state_data, dpr)
+        pixmap = self._cache.get(cache_key)
+        if pixmap is not None:
+            return pixmap
+
+        # Icona del pacchetto non ancora renderizzata (altro dpr o scartata dalla LRU)
+        svg = (self._icon_pack or {}).get(icon_name, {}).get(color or '')
+        if svg:
+            pixmap = self._render_svg(svg.encode('utf-8'), dpr)
+            self._cache.put(cache_key, pixmap)
+            return pixmap
+
+        # Già in caricamento: basta attendere
+        if cache_key in self._pending:
+            if callback:
+                self.subscribe(cache_key, callback)
+            return None
         
         # Check file cache
         cached_path = os.path.join(CACHE_DIR, f"{icon_name}.svg")
         if os.path.exists(cached_path):
-            self._load_image_from_file(cache_key, cached_path, color)
-            return None # The signal will deliver the pixmap
+            return self._load_image_from_file(cache_key, cached_path, color)
 
         # Download in a separate thread
+        if callback:
+            self.subscribe(cache_key, callback)
+        self._pending.add(cache_key)
         threading.Thread(target=self._download_image, args=(cache_key, icon_name, color), daemon=True).start()
         return None
 
@@ -1359,20 +3333,32 @@ class ImageProvider(QObject):
             if color:
                 svg_data = self._colorize_svg(svg_data, color)
             
-            renderer = QSvgRenderer(svg_data)
-            pixmap = QPixmap(ICON_SIZE, ICON_SIZE)
-            # Use the correct enum access for PyQt6
-            pixmap.fill(Qt.GlobalColor.transparent)
-            painter = QPainter(pixmap)
-            renderer.render(painter)
-            painter.end()
-
-            self._cache[cache_key] = pixmap
+            pixmap = self._render_svg(svg_data, cache_key[3])
+
+            self._cache.put(cache_key, pixmap)
             self.image_ready.emit(cache_key, pixmap)
+            return pixmap
         except Exception as e:
             logger.error(f"Error loading cached icon '{file_path}': {e}")
+            return None
     
-    def _colorize_svg(self, svg_data, color):
+    @staticmethod
+    def _render_svg(svg_data, dpr=1.0):
+        """Renderizza un SVG in un pixmap ICON_SIZE x ICON_SIZE (in pixel logici)."""
+        renderer = QSvgRenderer(svg_data)
+        # Sugli schermi HiDPI renderizza alla risoluzione fisica, senza riscalare
+        physical_size = round(ICON_SIZE * dpr)
+        pixmap = QPixmap(physical_size, physical_size)
+        # Use the correct enum access for PyQt6
+        pixmap.fill(Qt.GlobalColor.transparent)
+        painter = QPainter(pixmap)
+        renderer.render(painter)
+        painter.end()
+        pixmap.setDevicePixelRatio(dpr)
+        return pixmap
+
+    @staticmethod
+    def _colorize_svg(svg_data, color):
         """Colora un SVG sostituendo il colore di fill."""
         svg_str = svg_data.decode('utf-8')
         # Sostituisci il nero (#000) con il colore desiderato
@@ -1400,17 +3386,12 @@ class ImageProvider(QObject):
                 svg_data = self._colorize_svg(svg_data, color)
 
             # Render SVG directly for high quality
-            renderer = QSvgRenderer(svg_data)
-            pixmap = QPixmap(ICON_SIZE, ICON_SIZE)
-            # Use the correct enum access for PyQt6
-            pixmap.fill(Qt.GlobalColor.transparent)
-            painter = QPainter(pixmap)
-            renderer.render(painter)
-            painter.end()
-
-            self._cache[cache_key] = pixmap
+            pixmap = self._render_svg(svg_data, cache_key[3])
+
+            self._cache.put(cache_key, pixmap)
             self.image_ready.emit(cache_key, pixmap)
         except Exception as e:
+            self._pending.discard(cache_key)
             logger.error(f"Error downloading or converting icon '{icon_name}': {e}")
 
 class EntityWidget(QWidget):
@@ -1419,12 +3400,11 @@ class EntityWidget(QWidget):
         super().__init__()
         self.item = item
         self.image_provider = image_provider
-        self.image_provider.image_ready.connect(self._on_image_ready)
+        self.pending_icon_key = None  # cache_key dell'icona attesa dall'ImageProvider
         self.entity_id = item['entity_id']
         self.state_data = None # Cache for state data
         self.is_loading = False
-        self.animation_timer = None
-        self.rotation_angle = 0
+        self.is_animating = False
 
         # Stile card moderno
         self.setStyleSheet("""
@@ -1449,6 +3429,7 @@ class EntityWidget(QWidget):
         self.icon_label.setFixedSize(ICON_SIZE + 16, ICON_SIZE)  # Larghezza maggiore per centrare
 
         alias_label = QLabel(item.get('alias', self.entity_id))
+        self.alias_label = alias_label
         alias_label.setWordWrap(True)
         alias_label.setMaximumWidth(ICON_SIZE + 40)  # Larghezza maggiore per il testo
         alias_label.setMinimumHeight(36)  # Altezza minima per 3 righe di testo
@@ -1479,43 +3460,56 @@ class EntityWidget(QWidget):
         self.shadow.setEnabled(False) # Disabled by default
         self.setGraphicsEffect(self.shadow)
 
+    def bind(self, item):
+        """Associa il widget (riciclato dal pool) a una nuova entità."""
+        self.item = item
+        self.entity_id = item['entity_id']
+        self.state_data = None
+        self.alias_label.setText(item.get('alias', self.entity_id))
+        self.icon_label.clear()
+        self.setToolTip('')
+        self.shadow.setEnabled(False)
 
-    def _on_image_ready(self, cache_key, pixmap):
-        # Check if this image is still relevant for the current state
-        if self.is_loading and cache_key == 'loading_icon':
-            self._start_animation_timer(pixmap)
-        elif self.state_data:
-            current_icon_name = self._get_current_icon_name()
-            expected_cache_key = f"{self.entity_id.split('.')[0]}_{current_icon_name}"
-            if cache_key == expected_cache_key:
-                self.icon_label.setPixmap(pixmap)
-        # Handle the case where the state changed while the download was running
-        elif not self.state_data and cache_key == 'loading_icon':
-            # This handles the initial load of the loading icon
-            self._start_animation_timer(pixmap)
-
+    def release(self):
+        """Scollega il widget dall'entità prima di restituirlo al pool."""
+        self.stop_loading_animation()
+        self.image_provider.unsubscribe(self._on_image_ready)
+        self.pending_icon_key = None
+        self.state_data = None
+        self.hide()
 
-    def _get_current_icon_name(self):
-        if not self.state_data:
-            return 'alert-circle'
+    def set_alias(self, item):
+        """Aggiorna il nome mostrato (l'entità resta la stessa)."""
+        self.item = item
+        alias = item.get('alias', self.entity_id)
+        if self.alias_label.text() != alias:
+            self.alias_label.setText(alias)
 
-        domain = self.entity_id.split('.')[0]
-        state = self.state_data['state']
+    def _request_icon(self, domain, state_data):
+        """Ritorna il pixmap se disponibile, altrimenti resta in attesa di quello giusto."""
+        dpr = self.devicePixelRatioF()
+        self.pending_icon_key = self.image_provider.cache_key_for(domain, state_data, dpr)
+        pixmap = self.image_provider.get_pixmap(domain, state_data, self._on_image_ready, dpr)
+        if pixmap:
+            self.pending_icon_key = None
+        return pixmap
 
-        if domain == 'cover':
-            position = self.state_data.get('attributes', {}).get('current_position', 0)
-            if position < 36:
-                return ICONS_MAP['cover'].get(0, 'window-shutter')
-            else:
-                return ICONS_MAP['cover'].get('open', 'window-shutter-open')
+    def _on_image_ready(self, cache_key, pixmap):
+        # Ignora icone richieste per uno stato ormai superato
+        if cache_key != self.pending_icon_key:
+            return
+        self.pending_icon_key = None
+        if cache_key[0] == 'loading':
+            if self.is_loading:
+                self._start_animation_timer(pixmap)
         else:
-            return ICONS_MAP.get(domain, {}).get(state, 'alert-circle')
+            self.icon_label.setPixmap(pixmap)
 
     def update_visual_state(self, state_data):
         self.state_data = state_data # Cache the state
         self.stop_loading_animation()
         if state_data:
-            pixmap = self.image_provider.get_pixmap(self.entity_id.split('.')[0], state_data)
+            pixmap = self._request_icon(self.entity_id.split('.')[0], state_data)
             if pixmap: # If pixmap is in cache, display it
                 self.icon_label.setPixmap(pixmap)
 
@@ -1524,39 +3518,32 @@ class EntityWidget(QWidget):
                 self.setToolTip(f"Last Updated:\n{self.format_timestamp(last_updated)}")
         else:
             # Se non ci sono dati di stato, mostra icona di errore
-            pixmap = self.image_provider.get_pixmap('system', {'state': 'alert'})
+            pixmap = self._request_icon('system', {'state': 'alert'})
             if pixmap:
                 self.icon_label.setPixmap(pixmap)
 
     def start_loading_animation(self):
         self.is_loading = True
-        loading_pixmap = self.image_provider.get_pixmap('system', {'state': 'loading'})
+        loading_pixmap = self._request_icon('system', {'state': 'loading'})
         if loading_pixmap: # If loading icon is already cached
             self._start_animation_timer(loading_pixmap)
         # If not cached, _on_image_ready will start the animation when it's downloaded
 
     def _start_animation_timer(self, pixmap):
-        self.base_loading_pixmap = pixmap
-        if not self.animation_timer:
-            self.animation_timer = QTimer(self)
-            self.animation_timer.timeout.connect(self._rotate_icon)
-            self.animation_timer.start(50)
+        # Un solo timer condiviso anima tutti i widget in caricamento
+        self.image_provider.loading_animator.add(self, pixmap)
+        self.is_animating = True
     
     def stop_loading_animation(self):
         self.is_loading = False
-        if self.animation_timer:
-            self.animation_timer.stop()
-            self.animation_timer = None
-        self.rotation_angle = 0
+        if self.is_animating:
+            self.image_provider.loading_animator.remove(self)
+            self.is_animating = False
 
-    def _rotate_icon(self):
-        if not self.is_loading or not hasattr(self, 'base_loading_pixmap'):
-            return
-        self.rotation_angle = (self.rotation_angle - 15) % 360
-        transform = QTransform().rotate(self.rotation_angle)
-        # Use the correct enum access for PyQt6
-        rotated_pixmap = self.base_loading_pixmap.transformed(transform, Qt.TransformationMode.SmoothTransformation) 
-        self.icon_label.setPixmap(rotated_pixmap)
+    def set_loading_frame(self, pixmap):
+        """Chiamato dal LoadingAnimator ad ogni fotogramma."""
+        if self.is_loading:
+            self.icon_label.setPixmap(pixmap)
 
     def format_timestamp(self, ts_string):
         if ts_string == 'N/A': return ts_string
@@ -1566,12 +3553,53 @@ class EntityWidget(QWidget):
     def customEvent(self, event: QEvent):
         """Handles custom events, specifically for state updates."""
         if event.type() == StateUpdateEvent.EVENT_TYPE:
-            self.update_visual_state(event.state_data)
+            # Un widget riciclato può ricevere eventi destinati all'entità precedente
+            if not event.state_data or event.state_data.get('entity_id', self.entity_id) == self.entity_id:
+                self.update_visual_state(event.state_data)
             event.setAccepted(True)
         # Call super().customEvent for unhandled events
         super().customEvent(event)
 
 
+ENTITY_WIDGET_POOL_SIZE = 32     # widget liberi conservati per il riuso
+ENTITY_WIDGET_POOL_PREWARM = 8   # widget costruiti in anticipo all'avvio
+
+class EntityWidgetPool:
+    """Pool di EntityWidget riciclati tra un'area e l'altra.
+    
+    acquire() riassocia un widget libero alla nuova entità invece di costruirne
+    uno nuovo (stylesheet, etichette, ombra); release() lo scollega dai segnali
+    e lo nasconde. Oltre max_size widget liberi, quelli in più vengono distrutti.
+    """
+
+    def __init__(self, image_provider, parent, max_size=ENTITY_WIDGET_POOL_SIZE):
+        self.image_provider = image_provider
+        self.parent = parent
+        self.max_size = max_size
+        self._free = []
+
+    def prewarm(self, count=ENTITY_WIDGET_POOL_PREWARM):
+        """Costruisce in anticipo fino a count widget liberi."""
+        while len(self._free) < min(count, self.max_size):
+            widget = EntityWidget({'entity_id': 'system.pool'}, self.image_provider)
+            widget.setParent(self.parent)
+            widget.release()
+            self._free.append(widget)
+
+    def acquire(self, item):
+        if self._free:
+            widget = self._free.pop()
+            widget.bind(item)
+            return widget
+        return EntityWidget(item, self.image_provider)
+
+    def release(self, widget):
+        widget.release()
+        if len(self._free) < self.max_size:
+            self._free.append(widget)
+        else:
+            widget.deleteLater()
+
 class SettingsWindow(QWidget):
     """Finestra moderna per la configurazione dei parametri."""
     
@@ -2228,6 +4256,9 @@ class SettingsWindow(QWidget):
 class HomeAssistantGUI(QWidget):
     """The main application window - Agent mode."""
     area_detected_signal = Signal(str)
+    area_hint_signal = Signal(str)
+    ha_status_signal = Signal(str, str)
+    area_loaded_signal = Signal(str, str, list)
     
     def __init__(self, ha_instances, agent_mode=False):
         super().__init__()
@@ -2236,9 +4267,12 @@ class HomeAssistantGUI(QWidget):
         self.entity_widgets = []
         self.current_focus_index = 0
         self.image_provider = ImageProvider()
+        self.widget_pool = EntityWidgetPool(self.image_provider, self)
         self.current_area_id = None
-        self.ble_scanner_thread = None
-        self.stop_ble_scan = threading.Event()
+        self.presence_service = None
+        self.update_task = None
+        self.ws_client = None
+        self.widgets_by_entity = {}
         self.entities_loaded = False
         self.ble_mapping = None
         self.auto_hide_timer = None
@@ -2249,7 +4283,16 @@ class HomeAssistantGUI(QWidget):
         self.ha_instances = ha_instances  # Lista delle istanze configurate
         self.current_ha_url = HOME_ASSISTANT_URL
         self.current_ha_token = API_TOKEN
-        self.current_headers = HEADERS.copy()
+        self.current_headers = HEADERS.copy() if HEADERS else {}
+        self.pending_scan = False
+        self.rendered_entities = None
+        self.domain_rows = {}  # dominio -> (container riga, etichetta tipo, layout entità)
+        
+        # Stato di salute delle istanze, aggiornato in background
+        self.health_monitor = HAHealthMonitor(ha_instances, HOME_ASSISTANT_URL, API_TOKEN)
+        self.health_monitor.add_listener(
+            lambda url, token: self.ha_status_signal.emit(url or '', token or '')
+        )
         
         # Variabili per drag-and-drop
         self.dragging = False
@@ -2260,9 +4303,21 @@ class HomeAssistantGUI(QWidget):
         
         # Connetti il signal allo slot
         self.area_detected_signal.connect(self.update_area_entities)
+        self.area_hint_signal.connect(self.prefetch_hinted_area)
+        self.area_loaded_signal.connect(self.on_area_loaded)
+        self.ha_status_signal.connect(self.on_ha_status_changed)
+        self.health_monitor.start()
+        
+        # Precaricamento opzionale di tutte le aree mappate
+        self.prefetch_task = None
+        if HA_CONFIG['prefetch_areas']:
+            self.prefetch_task = get_async_runtime().submit(self._prefetch_loop())
 
         self.init_ui()
         
+        # Widget pronti per la prima area, costruiti appena il loop Qt è libero
+        QTimer.singleShot(0, self.widget_pool.prewarm)
+        
         # Crea system tray icon in modalità agent
         if agent_mode:
             self.create_system_tray()
@@ -2432,46 +4487,71 @@ class HomeAssistantGUI(QWidget):
             logger.error(f"Errore apertura settings: {e}")
     
     def reconnect_to_available_instance(self):
-        """Riconnette all'istanza Home Assistant disponibile.
-        Ritorna True se ha trovato un'istanza disponibile, False altrimenti.
+        """Verifica l'istanza Home Assistant disponibile usando lo stato in cache.
+        Non esegue richieste sul thread della GUI: se l'esito in cache è vecchio
+        avvia una rivalidazione in background.
+        Ritorna True se l'ultima istanza nota è disponibile, False altrimenti.
         """
-        logger.info("Verifica disponibilità istanza Home Assistant...")
+        url, token, available, fresh = self.health_monitor.snapshot()
+        if not fresh:
+            logger.info("Stato istanza Home Assistant non recente, verifica in background...")
+            self.health_monitor.revalidate()
+        
+        if available:
+            if url != self.current_ha_url:
+                self.switch_instance(url, token)
+            return True
         
-        # Usa detect_available_instance passando l'URL corrente
-        new_url, new_token = detect_available_instance(self.ha_instances, self.current_ha_url)
+        logger.error("Nessuna istanza Home Assistant disponibile")
+        safe_print("✗ Nessuna istanza disponibile")
+        return False
+
+    def on_ha_status_changed(self, url, token):
+        """Slot chiamato dal monitor quando cambia l'istanza disponibile."""
+        if not url:
+            logger.warning("Nessuna istanza Home Assistant raggiungibile")
+            return
         
-        if new_url and new_token:
-            # Controlla se l'istanza è cambiata
-            if new_url != self.current_ha_url:
-                logger.info(f"Cambio istanza: {self.current_ha_url} -> {new_url}")
-                safe_print(f"Cambio istanza: {new_url}")
-                
-                # Aggiorna le variabili di istanza
-                self.current_ha_url = new_url
-                self.current_ha_token = new_token
-                self.current_headers = {
-                    "Authorization": f"Bearer {new_token}",
-                    "Content-Type": "application/json",
-                }
-                
-                # Aggiorna anche le variabili globali per compatibilità
-                global HOME_ASSISTANT_URL, API_TOKEN, HEADERS
-                HOME_ASSISTANT_URL = new_url
-                API_TOKEN = new_token
-                HEADERS = self.current_headers.copy()
-                
-                # Pulisce i dispositivi in memoria dato che l'istanza è cambiata
-                self.clear_entities()
-                self.entities_loaded = False
-                self.current_area_id = None
-            else:
-                logger.info(f"Istanza corrente ancora disponibile: {new_url}")
-            
-            return True
-        else:
-            logger.error("Nessuna istanza Home Assistant disponibile")
-            safe_print("✗ Nessuna istanza disponibile")
-            return False
+        if url != self.current_ha_url:
+            self.switch_instance(url, token)
+        
+        # Riprende la scansione richiesta mentre Home Assistant non era raggiungibile
+        if self.pending_scan and self.isVisible():
+            self.pending_scan = False
+            self.start_ble_scanner(single_scan=True)
+
+    def switch_instance(self, new_url, new_token):
+        """Passa a una nuova istanza Home Assistant."""
+        logger.info(f"Cambio istanza: {self.current_ha_url} -> {new_url}")
+        safe_print(f"Cambio istanza: {new_url}")
+        
+        # Aggiorna le variabili di istanza
+        self.current_ha_url = new_url
+        self.current_ha_token = new_token
+        self.current_headers = {
+            "Authorization": f"Bearer {new_token}",
+            "Content-Type": "application/json",
+        }
+        
+        # Aggiorna anche le variabili globali per compatibilità
+        global HOME_ASSISTANT_URL, API_TOKEN, HEADERS
+        HOME_ASSISTANT_URL = new_url
+        API_TOKEN = new_token
+        HEADERS = self.current_headers.copy()
+        
+        # Chiude il WebSocket verso la vecchia istanza
+        if self.ws_client:
+            self.ws_client.stop()
+            self.ws_client = None
+        
+        # Senza WebSocket attivo la cache della nuova istanza non ha ricevuto
+        # gli eventi *_registry_updated: va ricaricata
+        get_registry_cache(new_url).invalidate()
+        
+        # Pulisce i dispositivi in memoria dato che l'istanza è cambiata
+        self.clear_entities()
+        self.entities_loaded = False
+        self.current_area_id = None
 
     def start_ble_scanner(self, single_scan=False):
         """Avvia lo scanner BLE in un thread separato.
@@ -2497,17 +4577,31 @@ class HomeAssistantGUI(QWidget):
             self.entities_loaded = False
             self.current_area_id = None
             self.clear_entities()
-            self.stop_ble_scan.clear()
 
         self.is_scanning = True
-        # Avvia lo scanner BLE
-        self.ble_scanner_thread = threading.Thread(
-            target=run_ble_scanner, 
-            args=(self.ble_mapping, self.on_area_detected, self.stop_ble_scan, single_scan), 
-            daemon=True
-        )
-        self.ble_scanner_thread.start()
         self.status_label.setText("Scanning for BLE devices...")
+        
+        # Lo scanner è condiviso con il controllo vocale: se l'area è già nota
+        # la callback arriva subito, senza una nuova scansione
+        self.presence_service = get_ble_presence_service(self.ble_mapping, BLE_CONFIG)
+        self.presence_service.subscribe_hints(self.on_area_hint)
+        if single_scan:
+            self.presence_service.request_area(self.on_area_detected, BLE_CONFIG['single_scan_timeout'])
+        # Finché la finestra è visibile segue i cambi di stanza
+        self.presence_service.subscribe(self.on_area_detected, notify_current=not single_scan)
+    
+    def stop_ble_updates(self):
+        """Smette di seguire i cambi di stanza (lo scanner si ferma quando nessuno lo usa più)."""
+        if self.presence_service:
+            self.presence_service.unsubscribe(self.on_area_detected)
+            self.presence_service.unsubscribe_hints(self.on_area_hint)
+        self.is_scanning = False
+    
+    def hideEvent(self, event):
+        # Solo le chiusure esplicite (auto-hide, tray): la finestra minimizzata continua a seguire la stanza
+        if not event.spontaneous():
+            self.stop_ble_updates()
+        super().hideEvent(event)
     
     def show_and_scan(self):
         """Mostra la finestra e avvia una nuova scansione BLE."""
@@ -2533,12 +4627,12 @@ class HomeAssistantGUI(QWidget):
         
         # Verifica connessione prima di usare i dispositivi in memoria
         if not self.reconnect_to_available_instance():
-            self.status_label.setText("Error: No Home Assistant instance available")
+            # La scansione riparte appena il monitor trova un'istanza raggiungibile
+            self.status_label.setText("Connecting to Home Assistant...")
             self.clear_entities()
-            return
-        
-        # Verifica se ci sono dispositivi già caricati in memoria e l'istanza è la stessa
-        if self.entity_widgets and self.entities_loaded:
+            self.pending_scan = True
+        elif self.entity_widgets and self.entities_loaded:
+            # Dispositivi già caricati in memoria e l'istanza è la stessa
             logger.info("Dispositivi ancora in memoria, riutilizzo senza scansione")
             safe_print(">>> Dispositivi in memoria: mostro senza scansionare")
             # I dispositivi sono già mostrati, non serve scansione
@@ -2581,6 +4675,9 @@ class HomeAssistantGUI(QWidget):
         logger.info("Cleanup: cancello dispositivi dalla memoria")
         safe_print(">>> Cleanup: dispositivi rimossi dalla memoria")
         self.clear_entities()
+        stats = self.image_provider.cache_stats()
+        logger.info(f"Cache icone: {stats['entries']} pixmap, {stats['bytes'] // 1024} KB, "
+                    f"{stats['hits']} hit, {stats['misses']} miss, {stats['evictions']} scartati")
         self.entities_loaded = False
         self.current_area_id = None
         self.status_label.setText("Scanning for BLE devices...")
@@ -2612,6 +4709,16 @@ class HomeAssistantGUI(QWidget):
         # Emetti il signal invece di usare QTimer
         self.area_detected_signal.emit(area_id)
 
+    def on_area_hint(self, area_id):
+        """Callback del servizio BLE (thread asyncio): passa il suggerimento al thread della GUI."""
+        self.area_hint_signal.emit(area_id)
+
+    def prefetch_hinted_area(self, area_id):
+        """Precarica l'area in cui l'utente sta probabilmente entrando."""
+        if area_id == self.current_area_id or not HOME_ASSISTANT_URL:
+            return
+        get_async_runtime().run_blocking(prefetch_areas, [area_id], ENTITY_DOMAINS)
+
     def update_area_entities(self, area_id):
         """Aggiorna le entità mostrate in base all'area rilevata."""
         logger.info(f"update_area_entities chiamato con area_id: {area_id}")
@@ -2639,18 +4746,54 @@ class HomeAssistantGUI(QWidget):
             self.clear_entities()
             return
         
+        # Mostra subito l'ultimo snapshot noto dell'area, se presente
+        snapshot = get_area_snapshot_store().get(self.current_ha_url, area_id, ENTITY_DOMAINS)
+        if snapshot:
+            logger.info(f"Snapshot trovato per l'area {area_id}, verifica in background")
+            self.render_area(area_id, snapshot['name'], snapshot['entities'])
+        else:
+            # I widget attuali restano visibili: render_area riusa quelli in comune con la nuova area
+            self.status_label.setText(f"Area: {area_id} - Loading entities...")
+            self.entities_loaded = False
+        
+        # Scarica i dati aggiornati senza bloccare la GUI (stale-while-revalidate)
+        get_async_runtime().run_blocking(self._fetch_area, area_id, self.current_ha_url)
+
+    def _fetch_area(self, area_id, ha_url):
+        """Recupera nome ed entità di un'area (thread separato) e aggiorna lo snapshot."""
         area_info = get_area_info(area_id)
-        area_name = area_info['name']
+        entities = get_entities_for_area(area_id, ENTITY_DOMAINS)
+        if entities:
+            get_area_snapshot_store().put(ha_url, area_id, area_info['name'], ENTITY_DOMAINS, entities)
+        self.area_loaded_signal.emit(area_id, area_info['name'], entities)
+
+    def on_area_loaded(self, area_id, area_name, entities):
+        """Slot chiamato quando i dati aggiornati di un'area sono disponibili."""
+        if area_id != self.current_area_id:
+            logger.info(f"Dati dell'area {area_id} scartati: area corrente cambiata")
+            return
+        
+        if self.entities_loaded and self.rendered_entities is not None:
+            if entities == self.rendered_entities:
+                logger.info(f"Snapshot dell'area {area_id} ancora valido")
+                self.status_label.setText(f"Area: {area_name} - Ready")
+                return
+            if not entities:
+                # Probabile errore di rete: meglio lo snapshot che una finestra vuota
+                logger.warning(f"Nessuna entità ricevuta per l'area {area_id}, mantengo lo snapshot")
+                return
+        
+        self.render_area(area_id, area_name, entities)
+
+    def render_area(self, area_id, area_name, entities):
+        """Mostra le entità di un'area riusando i widget e le righe già presenti."""
         logger.info(f"Nome area: {area_name}")
         
         self.status_label.setText(f"Area: {area_name} - Loading entities...")
 
-        # Pulisci i widget esistenti
-        self.clear_entities()
-
-        # Carica le entità per questa area da Home Assistant
-        entities = get_entities_for_area(area_id, ENTITY_DOMAINS)
         if not entities:
+            self.clear_entities()
+            self.rendered_entities = entities
             self.status_label.setText(f"No entities found for area: {area_name}")
             logger.warning(f"Nessuna entità trovata per l'area: {area_name}")
             return
@@ -2665,68 +4808,74 @@ class HomeAssistantGUI(QWidget):
                 entities_by_domain[domain] = []
             entities_by_domain[domain].append(item)
         
-        # Mappa nomi domini in etichette leggibili
-        domain_labels = {
-            'light': '💡 Lights',
-            'switch': '🔌 Switches',
-            'scene': '🎬 Scenes',
-            'script': '📜 Scripts',
-            'cover': '🪟 Covers',
-            'fan': '🌀 Fans',
-            'climate': '🌡️ Climate',
-            'media_player': '📺 Media',
-        }
+        # Le righe riusate devono mantenere il loro ordine, altrimenti si riparte da zero
+        kept_domains = sorted(
+            (domain for domain in self.domain_rows if domain in entities_by_domain),
+            key=lambda domain: self.entities_layout.indexOf(self.domain_rows[domain][0])
+        )
+        if kept_domains != [domain for domain in entities_by_domain if domain in self.domain_rows]:
+            self.clear_entities()
         
-        # Crea una riga (HBoxLayout) per ogni tipo di entità
-        for domain, domain_entities in entities_by_domain.items():
-            # Container per la riga completa (label + entità)
-            row_container = QVBoxLayout()
-            row_container.setSpacing(4)
-            
-            # Etichetta del tipo
-            type_label = QLabel(domain_labels.get(domain, domain.capitalize()))
-            type_label.setStyleSheet("""
-                color: #95a5a6;
-                font-size: 7pt;
-                font-weight: bold;
-                background: transparent;
-                padding: 2px;
-            """)
-            type_label.setAlignment(Qt.AlignmentFlag.AlignLeft)
-            row_container.addWidget(type_label)
-            
-            # Layout orizzontale per le entità
-            row_layout = QHBoxLayout()
-            row_layout.setSpacing(10)
-            row_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            
-            for item in domain_entities:
-                widget = EntityWidget(item, self.image_provider)
-                self.entity_widgets.append(widget)
-                row_layout.addWidget(widget)
-            
-            row_container.addLayout(row_layout)
-            self.entities_layout.addLayout(row_container)
+        focused_entity_id = None
+        if 0 <= self.current_focus_index < len(self.entity_widgets):
+            focused_entity_id = self.entity_widgets[self.current_focus_index].entity_id
+        
+        # Rimuove solo i widget e le righe che non servono più
+        entity_ids = {item['entity_id'] for item in entities}
+        kept_widgets = {}
+        for widget in self.entity_widgets:
+            if widget.entity_id in entity_ids:
+                kept_widgets[widget.entity_id] = widget
+            else:
+                self._remove_entity_widget(widget)
+        for domain in [domain for domain in self.domain_rows if domain not in entities_by_domain]:
+            self._remove_domain_row(domain)
+        
+        # Aggiunge le entità nuove e riordina quelle esistenti
+        entity_widgets = []
+        new_widgets = []
+        for row_index, (domain, domain_entities) in enumerate(entities_by_domain.items()):
+            row_layout = self._get_domain_row(domain, row_index)
+            for index, item in enumerate(domain_entities):
+                widget = kept_widgets.get(item['entity_id'])
+                if widget is None:
+                    widget = self.widget_pool.acquire(item)
+                    new_widgets.append(widget)
+                else:
+                    widget.set_alias(item)
+                if row_layout.indexOf(widget) != index:
+                    row_layout.removeWidget(widget)
+                    row_layout.insertWidget(index, widget)
+                    widget.show()
+                entity_widgets.append(widget)
+        # Nuova lista (non modificata in-place): viene letta anche dal thread del loop
+        self.entity_widgets = entity_widgets
+        self.rendered_entities = entities
+        logger.info(f"Widget riusati: {len(kept_widgets)}, creati: {len(new_widgets)}")
 
         # Aggiorna lo stato iniziale
         if self.entity_widgets:
-            self.entity_widgets[0].setFocus()
-            self.current_focus_index = 0
+            focused_ids = [widget.entity_id for widget in self.entity_widgets]
+            self.current_focus_index = focused_ids.index(focused_entity_id) if focused_entity_id in focused_ids else 0
+            self.entity_widgets[self.current_focus_index].setFocus()
             self.update_focus_highlight()
-            
-            # Fetch initial state for all widgets
-            for widget in self.entity_widgets:
+        
+        # I widget riusati mantengono il loro stato: si carica solo quello dei nuovi
+        if new_widgets:
+            # Fetch initial state for new widgets with a single request
+            for widget in new_widgets:
                 widget.start_loading_animation()
-                # Usa un thread separato per non bloccare l'UI
-                threading.Thread(
-                    target=self._load_initial_state, 
-                    args=(widget,), 
-                    daemon=True
-                ).start()
-
-        # Segna che le entità sono state caricate e ferma la scansione BLE
+            # Gli stati appena precaricati vengono mostrati subito; quelli più vecchi
+            # lasciano l'indicatore di caricamento fino alla richiesta live
+            self._dispatch_states(
+                new_widgets,
+                get_registry_cache().get_states([widget.entity_id for widget in new_widgets], HA_STATES_FRESH_AGE),
+            )
+            # Usa il pool di I/O del loop persistente per non bloccare l'UI
+            get_async_runtime().run_blocking(self._load_initial_states, new_widgets)
+
+        # Segna che le entità sono state caricate (la scansione continua per i cambi di stanza)
         self.entities_loaded = True
-        self.stop_ble_scan.set()
         self.status_label.setText(f"Area: {area_name} - Ready")
         
         # Ridimensiona la finestra in base al layout delle entità
@@ -2757,49 +4906,152 @@ class HomeAssistantGUI(QWidget):
         # Avvia gli aggiornamenti in background
         self.start_background_updates()
 
-    def _load_initial_state(self, widget):
-        """Carica lo stato iniziale di un widget in un thread separato."""
-        initial_state = get_stato_entita(widget.entity_id)
-        if initial_state:
-            QApplication.instance().postEvent(widget, StateUpdateEvent(initial_state))
+    def _load_initial_states(self, widgets):
+        """Carica lo stato iniziale di tutti i widget con una sola richiesta (thread separato)."""
+        states = get_stati_entita(widget.entity_id for widget in widgets)
+        self._dispatch_states(widgets, states)
+
+    def _dispatch_states(self, widgets, states):
+        """Distribuisce ai widget gli stati ottenuti da get_stati_entita."""
+        if not states:
+            return
+        for widget in widgets:
+            state_data = states.get(widget.entity_id)
+            if state_data:
+                # We need to update GUI from the main thread
+                QApplication.instance().postEvent(widget, StateUpdateEvent(state_data))
 
     def clear_entities(self):
         """Pulisce tutte le entità dalla GUI."""
         # Rimuovi tutti i widget
         for widget in self.entity_widgets:
-            widget.deleteLater()
-        self.entity_widgets.clear()
-        
-        # Rimuovi tutti i layout figli (i container delle righe)
-        while self.entities_layout.count():
-            row_container = self.entities_layout.takeAt(0)
-            if row_container.layout():
-                # È un VBoxLayout (container riga), rimuovi label e layout entità
-                while row_container.layout().count():
-                    child = row_container.layout().takeAt(0)
-                    if child.widget():
-                        child.widget().deleteLater()
-                    elif child.layout():
-                        # È l'HBoxLayout con le entità
-                        while child.layout().count():
-                            child.layout().takeAt(0)
-                        child.layout().deleteLater()
-                row_container.layout().deleteLater()
+            self._remove_entity_widget(widget)
+        self.entity_widgets = []
+        self.widgets_by_entity = {}
+        self.rendered_entities = None
+        if self.ws_client:
+            self.ws_client.set_entities([])
+        
+        # Rimuovi tutte le righe (etichetta tipo e layout entità)
+        for domain in list(self.domain_rows):
+            self._remove_domain_row(domain)
+
+    def _get_domain_row(self, domain, row_index):
+        """Ritorna il layout entità della riga di un dominio, creandola in posizione row_index."""
+        if domain in self.domain_rows:
+            return self.domain_rows[domain][2]
+        
+        # Mappa nomi domini in etichette leggibili
+        domain_labels = {
+            'light': '💡 Lights',
+            'switch': '🔌 Switches',
+            'scene': '🎬 Scenes',
+            'script': '📜 Scripts',
+            'cover': '🪟 Covers',
+            'fan': '🌀 Fans',
+            'climate': '🌡️ Climate',
+            'media_player': '📺 Media',
+        }
+        
+        # Container per la riga completa (label + entità)
+        row_container = QVBoxLayout()
+        row_container.setSpacing(4)
+        
+        # Etichetta del tipo
+        type_label = QLabel(domain_labels.get(domain, domain.capitalize()))
+        type_label.setStyleSheet("""
+            color: #95a5a6;
+            font-size: 7pt;
+            font-weight: bold;
+            background: transparent;
+            padding: 2px;
+        """)
+        type_label.setAlignment(Qt.AlignmentFlag.AlignLeft)
+        row_container.addWidget(type_label)
+        
+        # Layout orizzontale per le entità
+        row_layout = QHBoxLayout()
+        row_layout.setSpacing(10)
+        row_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        
+        row_container.addLayout(row_layout)
+        self.entities_layout.insertLayout(row_index, row_container)
+        self.domain_rows[domain] = (row_container, type_label, row_layout)
+        return row_layout
+
+    def _remove_domain_row(self, domain):
+        row_container, type_label, row_layout = self.domain_rows.pop(domain)
+        self.entities_layout.removeItem(row_container)
+        type_label.deleteLater()
+        row_layout.deleteLater()
+        row_container.deleteLater()
+
+    def _remove_entity_widget(self, widget):
+        row = self.domain_rows.get(widget.entity_id.split('.')[0])
+        if row:
+            row[2].removeWidget(widget)
+        self.widget_pool.release(widget)
+
+    async def _prefetch_loop(self):
+        """Mantiene in cache entità e stati di tutte le aree di ble_mapping."""
+        loop = asyncio.get_running_loop()
+        ble_mapping = await loop.run_in_executor(None, carica_mappatura_ble)
+        if not ble_mapping:
+            return
+        area_ids = sorted(set(ble_mapping.values()))
+        while True:
+            if HOME_ASSISTANT_URL:
+                try:
+                    await loop.run_in_executor(None, prefetch_areas, area_ids, ENTITY_DOMAINS)
+                except Exception as e:
+                    # Un errore di rete non deve fermare i precaricamenti successivi
+                    logger.error(f"Errore nel precaricamento delle aree: {e}")
+            # Ripete prima della scadenza della cache del registro
+            await asyncio.sleep(HA_PREFETCH_INTERVAL)
 
     def start_background_updates(self):
-        """Avvia gli aggiornamenti periodici dello stato."""
-        self.update_thread = threading.Thread(target=self._update_states_loop, daemon=True)
-        self.update_thread.start()
+        """Avvia gli aggiornamenti di stato: WebSocket se disponibile, polling REST come fallback."""
+        # Nuovo dizionario (non modificato in-place): viene letto dal thread del loop
+        self.widgets_by_entity = {widget.entity_id: widget for widget in self.entity_widgets}
+        
+        if HA_CONFIG['use_websocket'] and WEBSOCKET_AVAILABLE and self.current_ha_url:
+            if self.ws_client is None or self.ws_client.url != self.current_ha_url:
+                if self.ws_client:
+                    self.ws_client.stop()
+                self.ws_client = HAWebSocketClient(
+                    self.current_ha_url, self.current_ha_token, self._on_ws_state,
+                    on_event=get_registry_cache(self.current_ha_url).handle_event,
+                    event_types=HA_REGISTRY_EVENTS,
+                )
+                self.ws_client.start()
+            self.ws_client.set_entities(self.widgets_by_entity.keys())
+        
+        # Un solo ciclo di aggiornamento alla volta, anche dopo più cambi di area
+        if self.update_task:
+            self.update_task.cancel()
+        self.update_task = get_async_runtime().submit(self._update_states_loop())
+
+    def _on_ws_state(self, entity_id, state_data):
+        """Callback del client WebSocket (thread del loop): inoltra lo stato al widget."""
+        widget = self.widgets_by_entity.get(entity_id)
+        if widget is not None:
+            QApplication.instance().postEvent(widget, StateUpdateEvent(state_data))
 
-    def _update_states_loop(self):
+    async def _update_states_loop(self):
+        loop = asyncio.get_running_loop()
         while True:
-            for widget in self.entity_widgets:
-                if not widget.is_loading:
-                    state_data = get_stato_entita(widget.entity_id)
-                    if state_data:
-                        # We need to update GUI from the main thread
-                        QApplication.instance().postEvent(widget, StateUpdateEvent(state_data))
-            time.sleep(5)
+            # Con la sottoscrizione WebSocket attiva gli stati arrivano in push: niente polling
+            if self.ws_client and self.ws_client.subscribed:
+                await asyncio.sleep(5)
+                continue
+            # Una sola richiesta per tutte le entità visibili
+            widgets = [widget for widget in self.entity_widgets if not widget.is_loading]
+            if widgets:
+                states = await loop.run_in_executor(
+                    None, get_stati_entita, [widget.entity_id for widget in widgets]
+                )
+                self._dispatch_states(widgets, states)
+            await asyncio.sleep(5)
 
     def _toggle_and_update(self, item):
         entity_id = item['entity_id']
@@ -2945,7 +5197,7 @@ class HomeAssistantGUI(QWidget):
             widget = self.entity_widgets[self.current_focus_index]
             if not widget.is_loading:
                 widget.start_loading_animation()
-                threading.Thread(target=self._toggle_and_update, args=(widget.item,), daemon=True).start()
+                get_async_runtime().run_blocking(self._toggle_and_update, widget.item)
 
     def update_focus_highlight(self):
         for i, widget in enumerate(self.entity_widgets):
@@ -3019,11 +5271,10 @@ def cleanup():
     try:
         if 'logger' in globals():
             logger.info("Chiusura applicazione...")
-        if 'main_window' in globals():
-            if hasattr(main_window, 'stop_ble_scan'):
-                main_window.stop_ble_scan.set()
-            if hasattr(main_window, 'ble_scanner_thread') and main_window.ble_scanner_thread:
-                main_window.ble_scanner_thread.join(timeout=2)
+        if _ble_presence_service:
+            _ble_presence_service.stop()
+        get_async_runtime().stop()
+        close_ha_clients()
         if 'logger' in globals():
             logger.info("Risorse rilasciate correttamente")
     except Exception as e:
@@ -3031,6 +5282,10 @@ def cleanup():
             logger.error(f"Errore durante il cleanup: {e}")
 
 if __name__ == "__main__":
+    # Crea il pacchetto icone per la build (nessuna configurazione richiesta)
+    if len(sys.argv) > 1 and sys.argv[1] == '--build-icon-pack':
+        sys.exit(0 if build_icon_pack() else 1)
+    
     # Controlla se è richiesta la lista delle aree
     if len(sys.argv) > 1 and sys.argv[1] in ['--list-areas', '-l', 'areas']:
         # Carica solo la configurazione minima
@@ -3077,7 +5332,7 @@ if __name__ == "__main__":
         sys.exit(1) # Use exit code 1 to indicate error/already running
     
     # These variables need to be available to the whole script
-    global HOME_ASSISTANT_URL, API_TOKEN, APP_TITLE, ICON_SIZE, SHOW_TOOLTIPS, ENTITY_DOMAINS, HEADERS, logger, SOUNDS_ENABLED
+    global HOME_ASSISTANT_URL, API_TOKEN, APP_TITLE, ICON_SIZE, SHOW_TOOLTIPS, ENTITY_DOMAINS, HEADERS, logger, SOUNDS_ENABLED, BLE_CONFIG, HA_CONFIG
 
     # Setup logging first
     logger = setup_logging()
@@ -3095,7 +5350,7 @@ if __name__ == "__main__":
         logger.info("=== Avvio Hapy ===")
 
     # Load configuration and exit if it fails
-    ha_instances, APP_TITLE, ICON_SIZE, SHOW_TOOLTIPS, ENTITY_DOMAINS, VOICE_CONFIG, ENABLE_SOUNDS = carica_configurazione('config.ini')
+    ha_instances, APP_TITLE, ICON_SIZE, SHOW_TOOLTIPS, ENTITY_DOMAINS, VOICE_CONFIG, ENABLE_SOUNDS, BLE_CONFIG, HA_CONFIG = carica_configurazione('config.ini')
     if not ha_instances:
         logger.error("Configurazione non valida, uscita")
         sys.exit(1)
@@ -3149,7 +5404,10 @@ if __name__ == "__main__":
                 ble_mapping=ble_mapping,
                 entity_domains=VOICE_CONFIG.get('entity_domains', ['light']),
                 hotkey=VOICE_CONFIG.get('hotkey', 'ctrl+shift+i'),
-                group_lights_control=VOICE_CONFIG.get('group_lights_control', False)
+                group_lights_control=VOICE_CONFIG.get('group_lights_control', False),
+                ble_config=BLE_CONFIG,
+                capture_config=VOICE_CONFIG.get('capture'),
+                recognizer_config=VOICE_CONFIG.get('recognizer')
             )
             safe_print(f"[DEBUG] VoiceControlAgent creato: {voice_agent}")
             safe_print(f"  {VOICE_CONFIG.get('hotkey', 'ctrl+shift+i').upper()}: Comando vocale")
@@ -5,7 +5,7 @@ a = Analysis(
     ['smart_proximity_control.py'],
     pathex=[],
     binaries=[],
-    datas=[],
+    datas=[('icon_pack.json', '.')],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
@@ -0,0 +1,96 @@
+"""Script per confrontare la latenza dei backend di riconoscimento vocale su file WAV registrati.
+
+Uso:
+    python test_voice_latency.py [cartella_wav] [percorso_modello_vosk]
+
+Ogni file WAV (mono, 16 kHz consigliati) viene riconosciuto da tutti i backend
+disponibili. Se accanto al file esiste un .txt con la trascrizione attesa,
+viene mostrato anche se il testo riconosciuto coincide.
+
+Le registrazioni non sono incluse nel repository (sono dati personali e
+dipendono da voce e microfono): la cartella predefinita è voice_fixtures.
+"""
+import os
+import sys
+import glob
+import time
+import statistics
+import speech_recognition as sr
+from smart_proximity_control import (
+    GoogleRecognizerBackend, VoskRecognizerBackend, VOSK_MODEL_PATH
+)
+
+def load_fixtures(folder):
+    """Carica i file WAV della cartella come sr.AudioData, con l'eventuale trascrizione attesa."""
+    fixtures = []
+    for wav_path in sorted(glob.glob(os.path.join(folder, '*.wav'))):
+        with sr.AudioFile(wav_path) as source:
+            audio = sr.Recognizer().record(source)
+        expected = None
+        txt_path = os.path.splitext(wav_path)[0] + '.txt'
+        if os.path.exists(txt_path):
+            with open(txt_path, 'r', encoding='utf-8') as f:
+                expected = f.read().strip().lower()
+        fixtures.append((os.path.basename(wav_path), audio, expected))
+    return fixtures
+
+def create_backends(model_path):
+    """Crea tutti i backend disponibili, misurando il tempo di caricamento."""
+    backends = []
+    for factory in (GoogleRecognizerBackend, lambda: VoskRecognizerBackend(model_path)):
+        start = time.perf_counter()
+        try:
+            backend = factory()
+        except Exception as e:
+            print(f"⚠️  Backend non disponibile: {e}")
+            continue
+        print(f"✓ {backend.name} pronto in {time.perf_counter() - start:.2f}s")
+        backends.append(backend)
+    return backends
+
+def run_benchmark(folder, model_path):
+    fixtures = load_fixtures(folder)
+    if not fixtures:
+        print(f"❌ Nessun file WAV trovato in: {folder}")
+        return
+
+    print(f"🎧 {len(fixtures)} file WAV in {folder}\n")
+    backends = create_backends(model_path)
+    if not backends:
+        print("❌ Nessun backend di riconoscimento disponibile!")
+        return
+
+    for backend in backends:
+        print(f"\n🔍 {backend.name}\n")
+        print(f"{'File':<30} {'Audio':<8} {'Tempo':<8} {'OK':<4} {'Testo':<30}")
+        print("-" * 84)
+        latencies = []
+        matches = 0
+        for name, audio, expected in fixtures:
+            duration = len(audio.frame_data) / (audio.sample_rate * audio.sample_width)
+            start = time.perf_counter()
+            try:
+                text = backend.recognize(audio)
+            except sr.UnknownValueError:
+                text = ''
+            except sr.RequestError as e:
+                text = f'<errore: {e}>'
+            elapsed = time.perf_counter() - start
+            latencies.append(elapsed)
+            ok = ''
+            if expected is not None:
+                ok = '✅' if text.lower().strip() == expected else '❌'
+                matches += text.lower().strip() == expected
+            print(f"{name:<30} {duration:<8.2f} {elapsed:<8.2f} {ok:<4} {text:<30}")
+
+        print("-" * 84)
+        print(f"Latenza media: {statistics.mean(latencies):.2f}s, "
+              f"mediana: {statistics.median(latencies):.2f}s, massima: {max(latencies):.2f}s")
+        if any(expected is not None for _, _, expected in fixtures):
+            with_expected = sum(1 for _, _, expected in fixtures if expected is not None)
+            print(f"Trascrizioni corrette: {matches}/{with_expected}")
+
+if __name__ == "__main__":
+    folder = sys.argv[1] if len(sys.argv) > 1 else 'voice_fixtures'
+    model_path = sys.argv[2] if len(sys.argv) > 2 else VOSK_MODEL_PATH
+    run_benchmark(folder, model_path)
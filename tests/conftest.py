@@ -0,0 +1,15 @@
+"""Configurazione pytest: rende importabile smart_proximity_control dalla cartella del progetto."""
+import logging
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(autouse=True)
+def spc_logger(monkeypatch):
+    """Il logger globale viene creato solo in __main__: nei test usa quello senza handler."""
+    import smart_proximity_control as spc
+    monkeypatch.setattr(spc, 'logger', logging.getLogger('spc_logger'), raising=False)
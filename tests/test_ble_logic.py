@@ -0,0 +1,248 @@
+"""Test dei filtri RSSI, dell'isteresi di area e della politica di early exit BLE."""
+import pytest
+
+import smart_proximity_control as spc
+
+
+class FakeClock:
+    """Sostituisce time.monotonic per rendere deterministici tempi e scadenze."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(spc.time, 'monotonic', fake)
+    return fake
+
+
+# --- Filtri RSSI ---
+
+def test_raw_filter_returns_last_sample():
+    rssi_filter = spc.RawRssiFilter()
+    assert [rssi_filter.update(v) for v in (-60, -80, -70)] == [-60, -80, -70]
+
+
+def test_ewma_filter_smooths_towards_new_samples():
+    rssi_filter = spc.EwmaRssiFilter(alpha=0.5)
+    assert rssi_filter.update(-60) == -60.0
+    assert rssi_filter.update(-80) == pytest.approx(-70.0)
+    assert rssi_filter.update(-80) == pytest.approx(-75.0)
+
+
+def test_kalman_filter_damps_a_single_outlier():
+    rssi_filter = spc.KalmanRssiFilter(process_noise=0.5, measurement_noise=4.0)
+    for _ in range(10):
+        rssi_filter.update(-60)
+    value = rssi_filter.update(-90)
+    # Il picco di -30 dB viene attenuato, ma il filtro si sposta nella sua direzione
+    assert -70 < value < -60
+
+
+def test_kalman_filter_converges_on_a_constant_signal():
+    rssi_filter = spc.KalmanRssiFilter()
+    values = [rssi_filter.update(v) for v in [-70, -50] * 20]
+    assert values[-1] == pytest.approx(-60, abs=5)
+
+
+def test_median_filter_ignores_spikes_in_the_window():
+    rssi_filter = spc.MedianRssiFilter(window=3)
+    assert [rssi_filter.update(v) for v in (-60, -95, -62, -61)] == [-60, -77.5, -62, -62]
+
+
+def test_filter_factory_builds_independent_filters():
+    factory = spc.create_rssi_filter_factory('ewma', alpha=0.5)
+    first, second = factory(), factory()
+    first.update(-60)
+    assert second.update(-80) == -80.0
+
+
+def test_filter_factory_falls_back_to_raw_for_unknown_kind():
+    assert spc.create_rssi_filter_factory('unknown') is spc.RawRssiFilter
+
+
+def test_table_restarts_filter_after_beacon_went_silent(clock):
+    table = spc.BeaconRssiTable({'aa:aa': 'kitchen'}, max_age=10,
+                                filter_factory=spc.create_rssi_filter_factory('ewma', alpha=0.5))
+    table.update('AA:AA', -60)
+    table.update('AA:AA', -80)
+    assert table.rssi_for('aa:aa') == pytest.approx(-70.0)
+    clock.now += 11
+    table.update('AA:AA', -90)
+    assert table.rssi_for('AA:AA') == -90.0
+
+
+# --- Isteresi di area ---
+
+MAPPING = {'AA': 'kitchen', 'BB': 'living', 'CC': 'bedroom'}
+
+
+def test_hysteresis_takes_first_area_immediately(clock):
+    table = spc.BeaconRssiTable(MAPPING)
+    hysteresis = spc.AreaHysteresis(switch_margin_db=3, dwell_time=2)
+    table.update('AA', -60)
+    assert hysteresis.update(table, 'AA') == 'kitchen'
+
+
+def test_hysteresis_ignores_candidate_below_margin(clock):
+    table = spc.BeaconRssiTable(MAPPING)
+    hysteresis = spc.AreaHysteresis(switch_margin_db=3, dwell_time=2)
+    table.update('AA', -60)
+    hysteresis.update(table, 'AA')
+    table.update('BB', -58)
+    for _ in range(5):
+        clock.now += 1
+        assert hysteresis.update(table, 'BB') == 'kitchen'
+
+
+def test_hysteresis_switches_only_after_dwell_time(clock):
+    table = spc.BeaconRssiTable(MAPPING)
+    hysteresis = spc.AreaHysteresis(switch_margin_db=3, dwell_time=2)
+    table.update('AA', -70)
+    hysteresis.update(table, 'AA')
+    table.update('BB', -60)
+    assert hysteresis.update(table, 'BB') == 'kitchen'
+    clock.now += 1.5
+    assert hysteresis.update(table, 'BB') == 'kitchen'
+    clock.now += 0.5
+    assert hysteresis.update(table, 'BB') == 'living'
+
+
+def test_hysteresis_dwell_restarts_when_advantage_is_lost(clock):
+    table = spc.BeaconRssiTable(MAPPING)
+    hysteresis = spc.AreaHysteresis(switch_margin_db=3, dwell_time=2)
+    table.update('AA', -70)
+    hysteresis.update(table, 'AA')
+    table.update('BB', -60)
+    hysteresis.update(table, 'BB')
+    clock.now += 1.5
+    table.update('BB', -69)
+    assert hysteresis.update(table, 'BB') == 'kitchen'
+    clock.now += 0.1
+    table.update('BB', -60)
+    assert hysteresis.update(table, 'BB') == 'kitchen'
+    clock.now += 1.0
+    assert hysteresis.update(table, 'BB') == 'kitchen'
+
+
+def test_hysteresis_decide_applies_margin_without_dwell(clock):
+    table = spc.BeaconRssiTable(MAPPING)
+    hysteresis = spc.AreaHysteresis(switch_margin_db=3, dwell_time=2)
+    table.update('AA', -70)
+    assert hysteresis.decide(table, 'AA') == 'kitchen'
+    table.update('BB', -68)
+    assert hysteresis.decide(table, 'BB') == 'kitchen'
+    table.update('BB', -60)
+    assert hysteresis.decide(table, 'BB') == 'living'
+
+
+def test_hysteresis_switches_when_current_area_disappears(clock):
+    table = spc.BeaconRssiTable(MAPPING, max_age=10)
+    hysteresis = spc.AreaHysteresis(switch_margin_db=3, dwell_time=0)
+    table.update('AA', -60)
+    hysteresis.update(table, 'AA')
+    clock.now += 11
+    table.update('BB', -80)
+    assert hysteresis.update(table, 'BB') == 'living'
+
+
+# --- Early exit della scansione singola ---
+
+def test_early_exit_after_consecutive_dominant_advertisements(clock):
+    table = spc.BeaconRssiTable(MAPPING)
+    policy = spc.BleEarlyExitPolicy(MAPPING, margin_db=6, required_advertisements=3)
+    table.update('BB', -80)
+    table.update('AA', -60)
+    assert policy.observe(table, 'AA') is False
+    assert policy.observe(table, 'AA') is False
+    assert policy.observe(table, 'AA') is True
+
+
+def test_early_exit_streak_resets_without_margin(clock):
+    table = spc.BeaconRssiTable(MAPPING)
+    policy = spc.BleEarlyExitPolicy(MAPPING, margin_db=6, required_advertisements=2)
+    table.update('AA', -60)
+    table.update('BB', -80)
+    assert policy.observe(table, 'AA') is False
+    table.update('BB', -62)
+    assert policy.observe(table, 'BB') is False
+    table.update('BB', -80)
+    assert policy.observe(table, 'AA') is False
+    assert policy.observe(table, 'AA') is True
+
+
+def test_early_exit_when_every_mapped_beacon_was_heard(clock):
+    table = spc.BeaconRssiTable(MAPPING)
+    policy = spc.BleEarlyExitPolicy(MAPPING, margin_db=6, required_advertisements=10)
+    for mac in ('AA', 'BB'):
+        table.update(mac, -60)
+        assert policy.observe(table, mac) is False
+    table.update('CC', -61)
+    assert policy.observe(table, 'CC') is True
+
+
+def test_early_exit_waits_before_trusting_a_lone_beacon(clock):
+    table = spc.BeaconRssiTable(MAPPING)
+    policy = spc.BleEarlyExitPolicy(MAPPING, margin_db=6, required_advertisements=3,
+                                    single_beacon_min_time=1.5)
+    for _ in range(5):
+        clock.now += 0.1
+        table.update('CC', -85)
+        assert policy.observe(table, 'CC') is False
+    clock.now += 1.5
+    results = []
+    for _ in range(3):
+        table.update('CC', -85)
+        results.append(policy.observe(table, 'CC'))
+    assert results == [False, False, True]
+
+
+def test_early_exit_nearer_beacon_takes_over_lone_one(clock):
+    table = spc.BeaconRssiTable(MAPPING)
+    policy = spc.BleEarlyExitPolicy(MAPPING, margin_db=6, required_advertisements=2)
+    table.update('CC', -85)
+    assert policy.observe(table, 'CC') is False
+    table.update('AA', -55)
+    assert policy.observe(table, 'AA') is False
+    assert policy.observe(table, 'AA') is True
+    assert table.strongest()[0] == 'AA'
+
+
+# --- Servizio di presenza ---
+
+def test_expired_waiter_gets_strongest_beacon_without_margin(clock):
+    service = spc.BlePresenceService(MAPPING, {})
+    service.table.update('AA', -60)
+    service.table.update('BB', -63)
+    received = []
+    service._waiters.append((received.append, clock.now + 3))
+    service._expire_waiters()
+    assert received == []
+    clock.now += 3
+    service._expire_waiters()
+    assert received == ['kitchen']
+
+
+def test_expired_waiter_gets_none_when_no_beacon_is_visible(clock):
+    service = spc.BlePresenceService(MAPPING, {})
+    received = []
+    service._waiters.append((received.append, clock.now))
+    service._expire_waiters()
+    assert received == [None]
+
+
+def test_publish_notifies_waiter_that_is_also_subscribed_once(clock):
+    service = spc.BlePresenceService(MAPPING, {})
+    received, others = [], []
+    service._subscribers.extend([received.append, others.append])
+    service._waiters.append((received.append, clock.now + 5))
+    service._publish('living')
+    assert received == ['living']
+    assert others == ['living']
+    service._publish('kitchen')
+    assert received == ['living', 'kitchen']
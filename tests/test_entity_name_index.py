@@ -0,0 +1,121 @@
+"""Equivalenza tra EntityNameIndex e la ricerca lineare dei nomi che sostituisce."""
+import pytest
+
+import smart_proximity_control as spc
+
+
+def linear_find_entity_by_name(entities, name_to_find, current_room_entities=None, entity_domains=None):
+    """Ricerca lineare originale (prima dell'indice), usata come riferimento."""
+    name_lower = name_to_find.lower().strip()
+    if entity_domains is None:
+        entity_domains = ['light']
+
+    if current_room_entities:
+        for entity in current_room_entities:
+            friendly_name = entity.get('attributes', {}).get('friendly_name', '')
+            if friendly_name.lower() == name_lower:
+                return entity['entity_id']
+
+        for entity in current_room_entities:
+            friendly_name = entity.get('attributes', {}).get('friendly_name', '')
+            entity_id = entity['entity_id']
+            if name_lower in friendly_name.lower() or name_lower in entity_id.lower():
+                return entity['entity_id']
+
+    domain_prefixes = tuple(f"{d}." for d in entity_domains)
+    filtered_entities = [e for e in entities if e['entity_id'].startswith(domain_prefixes)]
+
+    for entity in filtered_entities:
+        friendly_name = entity.get('attributes', {}).get('friendly_name', '')
+        if friendly_name.lower() == name_lower:
+            return entity['entity_id']
+
+    for entity in filtered_entities:
+        friendly_name = entity.get('attributes', {}).get('friendly_name', '')
+        entity_id = entity['entity_id']
+        if name_lower in friendly_name.lower() or name_lower in entity_id.lower():
+            return entity['entity_id']
+
+    return None
+
+
+def entity(entity_id, friendly_name=None):
+    attributes = {'friendly_name': friendly_name} if friendly_name is not None else {}
+    return {'entity_id': entity_id, 'attributes': attributes}
+
+
+ENTITIES = [
+    entity('light.soggiorno_led', 'Striscia LED Soggiorno'),
+    entity('light.cucina', 'Luce Cucina'),
+    entity('light.cucina_isola', 'Luce'),
+    entity('switch.luce_cucina', 'Luce Cucina'),
+    entity('light.bagno', 'Specchio'),
+    entity('cover.tapparella_sala', 'Tapparella Sala'),
+    entity('light.senza_nome'),
+    entity('fan.ventilatore', 'Ventilatore Camera'),
+]
+ROOM = [
+    entity('switch.luce_cucina', 'Luce Cucina'),
+    entity('light.cucina_isola', 'Luce'),
+]
+
+QUERIES = [
+    # Nome esatto
+    'Luce Cucina', 'luce', 'SPECCHIO', '  tapparella sala  ',
+    # Sottostringa del friendly_name o dell'entity_id
+    'led', 'cucina', 'isola', 'soggiorno_led', 'senza', 'ventil', 'light.bagno',
+    # Più corte di 3 caratteri (niente trigrammi)
+    'lu', 'o', 'le', '',
+    # Nessuna corrispondenza testuale
+    'garage',
+]
+
+
+@pytest.mark.parametrize('query', QUERIES)
+@pytest.mark.parametrize('domains', [None, ['light'], ['light', 'switch', 'cover']])
+@pytest.mark.parametrize('room', [None, ROOM])
+def test_textual_lookup_matches_linear_scan(query, domains, room):
+    expected = linear_find_entity_by_name(ENTITIES, query, room, domains)
+    if expected is None:
+        # La ricerca indicizzata prosegue con la somiglianza: qui si confronta solo la parte testuale
+        name_lower = query.lower().strip()
+        index = spc.EntityNameIndex(ENTITIES)
+        allowed = set(domains or ['light'])
+        assert index.find_exact(name_lower, allowed) is None
+        assert index.find_substring(name_lower, allowed) is None
+        if room:
+            room_index = spc.EntityNameIndex(room)
+            assert room_index.find_exact(name_lower) is None
+            assert room_index.find_substring(name_lower) is None
+    else:
+        assert spc.voice_find_entity_by_name(ENTITIES, query, room, domains) == expected
+
+
+def test_room_entities_win_over_earlier_matches():
+    # 'cucina' compare prima in light.cucina, ma la stanza corrente ha la precedenza
+    assert linear_find_entity_by_name(ENTITIES, 'cucina', ROOM, ['light', 'switch']) == 'switch.luce_cucina'
+    assert spc.voice_find_entity_by_name(ENTITIES, 'cucina', ROOM, ['light', 'switch']) == 'switch.luce_cucina'
+
+
+def test_domain_filter_skips_other_domains():
+    assert spc.voice_find_entity_by_name(ENTITIES, 'tapparella sala', entity_domains=['cover']) == 'cover.tapparella_sala'
+    index = spc.EntityNameIndex(ENTITIES)
+    assert index.find_exact('tapparella sala', {'light'}) is None
+    assert index.find_substring('tapparella', {'light'}) is None
+
+
+def test_short_queries_respect_list_order_and_domains():
+    index = spc.EntityNameIndex(ENTITIES)
+    assert index.find_substring('o', {'light'}) == 'light.soggiorno_led'
+    assert index.find_substring('o', {'fan'}) == 'fan.ventilatore'
+    assert index.find_substring('', {'switch'}) == 'switch.luce_cucina'
+
+
+def test_update_stays_equivalent_after_rename_and_removal():
+    index = spc.EntityNameIndex(ENTITIES)
+    renamed = [entity('light.bagno', 'Luce Bagno')] + [e for e in ENTITIES[1:] if e['entity_id'] != 'light.bagno']
+    index.update(renamed)
+    for query in ('specchio', 'bagno', 'led', 'luce', 'lu'):
+        expected = linear_find_entity_by_name(renamed, query, entity_domains=['light'])
+        found = index.find_exact(query, {'light'}) or index.find_substring(query, {'light'})
+        assert found == expected
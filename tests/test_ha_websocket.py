@@ -0,0 +1,32 @@
+"""Test della gestione dei messaggi del WebSocket Home Assistant."""
+import smart_proximity_control as spc
+
+
+def make_client(received):
+    client = spc.HAWebSocketClient('http://ha.local:8123', 'token',
+                                   lambda entity_id, state: received.append((entity_id, state['state'])))
+    client._subscription_id = 3
+    return client
+
+
+def test_subscribed_only_after_successful_result():
+    client = make_client([])
+    client._handle_message({'id': 2, 'type': 'result', 'success': True})
+    assert client.subscribed is False
+    client._handle_message({'id': 3, 'type': 'result', 'success': False, 'error': {'code': 'invalid'}})
+    assert client.subscribed is False
+    client._handle_message({'id': 3, 'type': 'result', 'success': True, 'result': None})
+    assert client.subscribed is True
+
+
+def test_entities_event_applies_diffs():
+    received = []
+    client = make_client(received)
+    client._handle_message({'id': 3, 'type': 'event', 'event': {
+        'a': {'light.cucina': {'s': 'off', 'a': {'friendly_name': 'Cucina'}, 'lc': 1700000000.0}},
+    }})
+    client._handle_message({'id': 3, 'type': 'event', 'event': {
+        'c': {'light.cucina': {'+': {'s': 'on', 'a': {'brightness': 200}, 'lc': 1700000010.0}}},
+    }})
+    assert received == [('light.cucina', 'off'), ('light.cucina', 'on')]
+    assert client._states['light.cucina']['a'] == {'friendly_name': 'Cucina', 'brightness': 200}
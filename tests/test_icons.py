@@ -0,0 +1,23 @@
+"""Test della scelta delle icone per stato."""
+import smart_proximity_control as spc
+
+
+def test_icon_variant_colors_only_powered_devices():
+    assert spc.icon_variant('light', {'state': 'on'}) == ('lightbulb', spc.ICON_ON_COLOR)
+    assert spc.icon_variant('light', {'state': 'off'}) == ('lightbulb-off', None)
+    assert spc.icon_variant('light', {'state': 'unavailable'}) == ('alert-circle', None)
+
+
+def test_icon_variant_uses_cover_position():
+    closed = {'state': 'open', 'attributes': {'current_position': 20}}
+    opened = {'state': 'open', 'attributes': {'current_position': 80}}
+    assert spc.icon_variant('cover', closed)[0] == 'window-shutter'
+    assert spc.icon_variant('cover', opened)[0] == 'window-shutter-open'
+
+
+def test_icon_pack_states_do_not_need_the_configuration(monkeypatch):
+    # --build-icon-pack gira prima del caricamento di config.ini, quindi senza ICON_SIZE
+    monkeypatch.delattr(spc, 'ICON_SIZE', raising=False)
+    variants = {spc.icon_variant(domain, state_data) for domain, state_data in spc.icon_pack_states()}
+    assert ('lightbulb', spc.ICON_ON_COLOR) in variants
+    assert ('window-shutter-open', None) in variants
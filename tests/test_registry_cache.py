@@ -0,0 +1,37 @@
+"""Test della cache del registro Home Assistant."""
+import smart_proximity_control as spc
+
+
+STATES = [
+    {'entity_id': 'light.cucina', 'state': 'on', 'attributes': {'friendly_name': 'Luce Cucina'}},
+    {'entity_id': 'switch.forno', 'state': 'off', 'attributes': {}},
+]
+
+
+def test_get_states_respects_max_age(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(spc.time, 'monotonic', lambda: now[0])
+    cache = spc.HARegistryCache('http://ha.local:8123', ttl=300)
+    cache.set_entities(STATES)
+
+    assert cache.get_states(['light.cucina'], max_age=5) == {'light.cucina': STATES[0]}
+    now[0] += 10
+    # Troppo vecchio per essere mostrato come definitivo, ma ancora valido per il ttl
+    assert cache.get_states(['light.cucina'], max_age=5) == {}
+    assert cache.get_states(['light.cucina', 'light.assente']) == {'light.cucina': STATES[0]}
+    now[0] += 300
+    assert cache.get_states(['light.cucina']) == {}
+
+
+def test_invalidate_drops_areas_entities_and_states():
+    cache = spc.HARegistryCache('http://ha.local:8123')
+    cache.set_area_names({'kitchen': 'Cucina'})
+    cache.set_area_entity_ids('kitchen', ['light.cucina'])
+    cache.set_entities(STATES)
+
+    cache.invalidate()
+
+    assert cache.get_area_name('kitchen') is None
+    assert cache.get_area_entity_ids('kitchen') is None
+    assert not cache.entities_valid()
+    assert cache.get_states(['light.cucina']) == {}
@@ -0,0 +1,37 @@
+"""Test della hotkey del controllo vocale."""
+import concurrent.futures
+import threading
+
+import smart_proximity_control as spc
+
+
+class FakeController:
+    is_connected = True
+    ble_mapping = None
+
+    def __init__(self):
+        self.calls = 0
+        self.release = threading.Event()
+
+    def listen_and_execute(self):
+        self.calls += 1
+        self.release.wait(5)
+
+
+def test_hotkey_is_ignored_while_listening():
+    agent = spc.VoiceControlAgent([])
+    agent.controller = FakeController()
+    agent.is_running = True
+    agent._voice_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    try:
+        agent._on_hotkey()
+        first = agent._voice_future
+        agent._on_hotkey()
+        assert agent._voice_future is first
+        agent.controller.release.set()
+        first.result(timeout=5)
+        agent._on_hotkey()
+        agent._voice_future.result(timeout=5)
+        assert agent.controller.calls == 2
+    finally:
+        agent.stop()
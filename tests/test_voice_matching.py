@@ -0,0 +1,73 @@
+"""Test della ricerca approssimata dei nomi delle entità per il controllo vocale."""
+import pytest
+
+import smart_proximity_control as spc
+
+
+ENTITIES = [
+    {'entity_id': 'light.lampada_comodino', 'attributes': {'friendly_name': 'Lampada del Comodino'}},
+    {'entity_id': 'light.lampadario_sala', 'attributes': {'friendly_name': 'Lampadario Sala'}},
+    {'entity_id': 'switch.presa_comodino', 'attributes': {'friendly_name': 'Presa Comodino'}},
+    {'entity_id': 'light.luce_cucina', 'attributes': {'friendly_name': 'Luce Cucina'}},
+]
+
+
+@pytest.mark.parametrize('first, second, key', [
+    ('cucina', 'kucina', 'ksn'),
+    ('lampada', 'lampade', 'lmpd'),
+    ('schermo', 'skermo', 'skrm'),
+    ('chiave', 'kiave', 'kv'),
+    ('giallo', 'gialo', 'gl'),
+])
+def test_phonetic_key_groups_spellings(first, second, key):
+    assert spc.phonetic_key(first) == key
+    assert spc.phonetic_key(second) == key
+
+
+def test_name_tokens_drop_accents_and_stopwords():
+    assert [word for word, _ in spc.name_tokens('Lampada del Comodino')] == ['lampada', 'comodino']
+    assert [word for word, _ in spc.name_tokens('Luce Più')] == ['luce', 'piu']
+    # Un nome fatto solo di stopword resta ricercabile
+    assert [word for word, _ in spc.name_tokens('Il')] == ['il']
+
+
+def test_token_set_similarity():
+    tokens = spc.name_tokens
+    assert spc.token_set_similarity(tokens('luce cucina'), tokens('Luce della Cucina')) == 1.0
+    assert spc.token_set_similarity(tokens('luce cucina'), tokens('luce bagno')) == pytest.approx(0.5)
+    # Stessa chiave fonetica: 0.9 per la parola
+    assert spc.token_set_similarity(tokens('kucina'), tokens('cucina')) == pytest.approx(0.9)
+    assert spc.token_set_similarity(tokens('cucina'), ()) == 0.0
+
+
+def test_find_similar_matches_name_with_stopwords():
+    index = spc.EntityNameIndex(ENTITIES)
+    entity_id, confidence = index.find_similar('lampada comodino')[0]
+    assert entity_id == 'light.lampada_comodino'
+    assert round(confidence, 2) == 1.00
+
+
+def test_find_similar_tolerates_misspellings():
+    index = spc.EntityNameIndex(ENTITIES)
+    entity_id, confidence = index.find_similar('lampadario salla')[0]
+    assert entity_id == 'light.lampadario_sala'
+    assert confidence >= spc.VOICE_MATCH_THRESHOLD
+
+
+def test_find_similar_unknown_room_stays_below_threshold():
+    index = spc.EntityNameIndex(ENTITIES)
+    candidates = index.find_similar('lampada studio')
+    assert candidates
+    assert all(confidence < spc.VOICE_MATCH_THRESHOLD for _, confidence in candidates)
+
+
+def test_find_similar_filters_domains():
+    index = spc.EntityNameIndex(ENTITIES)
+    assert index.find_similar('presa comodino')[0][0] == 'switch.presa_comodino'
+    assert all(entity_id.startswith('light.')
+               for entity_id, _ in index.find_similar('presa comodino', {'light'}))
+
+
+def test_voice_find_entity_by_name_uses_similarity_threshold():
+    assert spc.voice_find_entity_by_name(ENTITIES, 'lampada comodino') == 'light.lampada_comodino'
+    assert spc.voice_find_entity_by_name(ENTITIES, 'lampada studio') is None